@@ -1,5 +1,6 @@
 import os
 import logging
+import tempfile
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
@@ -7,8 +8,8 @@ from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (LOG_LEVEL=DEBUG for development only: it adds a log line per detection)
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper())
 
 class Base(DeclarativeBase):
     pass
@@ -31,6 +32,69 @@ def create_app():
     app.config["PROFILE_PHOTOS_FOLDER"] = "static/profile_photos"
     app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max file size
     
+    # Authentication: per-process cache of loaded users (0 = disabled) and password hash cost,
+    # e.g. "scrypt:16384:8:1" or "pbkdf2:sha256:600000"; older hashes are upgraded at login
+    app.config["USER_CACHE_TTL"] = int(os.environ.get("USER_CACHE_TTL", 30))
+    app.config["USER_CACHE_SIZE"] = int(os.environ.get("USER_CACHE_SIZE", 1024))
+    app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt")
+    
+    # Translation backend ('google', 'google_async' or 'local'), see translation_backends.py
+    app.config["TRANSLATION_BACKEND"] = os.environ.get("TRANSLATION_BACKEND", "google")
+    app.config["TRANSLATION_BACKEND_TIMEOUTS"] = {
+        "google": float(os.environ.get("GOOGLE_TRANSLATE_TIMEOUT", 10)),
+        "google_async": float(os.environ.get("GOOGLE_TRANSLATE_TIMEOUT", 10)),
+        "local": float(os.environ.get("LOCAL_TRANSLATE_TIMEOUT", 5)),
+    }
+    app.config["TRANSLATION_BACKEND_OPTIONS"] = {
+        "google_async": {
+            "max_connections": int(os.environ.get("TRANSLATION_MAX_CONNECTIONS", 20)),
+            "concurrency": int(os.environ.get("TRANSLATION_CONCURRENCY", 8)),  # In-flight requests per host
+            "retries": int(os.environ.get("TRANSLATION_RETRIES", 3)),
+            "deadline": float(os.environ.get("TRANSLATION_DEADLINE", 30)),  # Seconds per call, queueing and retries included
+        },
+        "local": {
+            "latency": float(os.environ.get("LOCAL_TRANSLATE_LATENCY", 0)),
+            "phrase_table": os.environ.get("LOCAL_PHRASE_TABLE"),
+        },
+    }
+    
+    # Language detection (sampling, memoization and deterministic seed)
+    app.config["DETECTION_SAMPLE_SIZE"] = int(os.environ.get("DETECTION_SAMPLE_SIZE", 3000))
+    app.config["DETECTION_CACHE_SIZE"] = int(os.environ.get("DETECTION_CACHE_SIZE", 4096))
+    app.config["DETECTION_SEED"] = int(os.environ.get("DETECTION_SEED", 0))
+    
+    # Translation memory (in-process LRU + persistent table)
+    app.config["TRANSLATION_MEMORY_ENABLED"] = os.environ.get("TRANSLATION_MEMORY_ENABLED", "1") == "1"
+    app.config["TRANSLATION_MEMORY_SIZE"] = int(os.environ.get("TRANSLATION_MEMORY_SIZE", 2048))
+    app.config["TRANSLATION_MEMORY_TTL"] = int(os.environ.get("TRANSLATION_MEMORY_TTL", 30 * 24 * 3600))
+    app.config["TRANSLATION_MEMORY_MAX_ROWS"] = int(os.environ.get("TRANSLATION_MEMORY_MAX_ROWS", 100000))
+    # Lock files coalescing identical translations across worker processes ("" = this process only)
+    app.config["SINGLEFLIGHT_LOCK_DIR"] = os.environ.get(
+        "SINGLEFLIGHT_LOCK_DIR", os.path.join(tempfile.gettempdir(), "translator-singleflight")
+    )
+    app.config["SINGLEFLIGHT_WAIT_TIMEOUT"] = float(os.environ.get("SINGLEFLIGHT_WAIT_TIMEOUT", 15))  # Seconds to wait for another process's result before translating
+    app.config["TRANSLATION_BATCH_SIZE"] = int(os.environ.get("TRANSLATION_BATCH_SIZE", 50))  # Strings per translate_batch call (the google backend packs them into requests of BATCH_MAX_CHARS)
+    app.config["TEXT_COMPRESSION_MIN_SIZE"] = int(os.environ.get("TEXT_COMPRESSION_MIN_SIZE", 2048))  # Bytes from which stored texts are compressed, 0 = never
+    app.config["EXPORT_BATCH_SIZE"] = int(os.environ.get("EXPORT_BATCH_SIZE", 500))  # Rows fetched per round-trip when exporting
+    app.config["BATCH_MAX_TEXTS"] = int(os.environ.get("BATCH_MAX_TEXTS", 500))  # Texts per batch API request
+    app.config["TRANSLATION_CHUNK_SIZE"] = int(os.environ.get("TRANSLATION_CHUNK_SIZE", 4500))  # Characters per .txt chunk
+    app.config["TRANSLATION_WORKERS"] = int(os.environ.get("TRANSLATION_WORKERS", 4))  # Concurrent chunk translations per file
+    app.config["FILE_JOB_WORKERS"] = int(os.environ.get("FILE_JOB_WORKERS", 2))  # Background file processes, 0 = inline
+    app.config["FILE_JOB_STALE_AFTER"] = int(os.environ.get("FILE_JOB_STALE_AFTER", 1800))  # Seconds without an update after which an active job is failed as lost
+    
+    # Profile photos: thumbnails built by a thread pool (0 = in the request), served with long cache lifetimes
+    app.config["AVATAR_WORKERS"] = int(os.environ.get("AVATAR_WORKERS", 2))
+    app.config["AVATAR_MAX_AGE"] = int(os.environ.get("AVATAR_MAX_AGE", 365 * 24 * 3600))
+    
+    # Downloads: "x-sendfile" (Apache) or "x-accel-redirect" (nginx) lets the front proxy send the file
+    app.config["DOWNLOAD_OFFLOAD"] = os.environ.get("DOWNLOAD_OFFLOAD", "")
+    app.config["DOWNLOAD_ACCEL_PREFIX"] = os.environ.get("DOWNLOAD_ACCEL_PREFIX", "/protected-uploads/")  # internal location of UPLOAD_FOLDER
+    
+    # Request metrics served on /metrics (stage timings and SQL counts on a sample of requests)
+    app.config["METRICS_ENABLED"] = os.environ.get("METRICS_ENABLED", "1") == "1"
+    app.config["METRICS_SAMPLE_RATE"] = float(os.environ.get("METRICS_SAMPLE_RATE", 0.1))
+    app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN")  # Bearer token; without it /metrics is only served in debug mode
+    
     # Create upload directories
     os.makedirs(app.config["UPLOAD_FOLDER"], exist_ok=True)
     os.makedirs(app.config["PROFILE_PHOTOS_FOLDER"], exist_ok=True)
@@ -47,19 +111,27 @@ def create_app():
     login_manager.login_message_category = 'info'
     
     # Import models and routes
-    from models import User, Translation
+    from models import User, Translation, TranslationMemoryEntry, FileTranslationJob, TranslationStat, StoredFile, TranslationArtifact
     from routes import register_blueprints
+    from metrics import init_metrics
+    from file_store import init_file_store
+    from avatars import init_avatars
+    from user_cache import user_cache
+    from search import init_search
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return user_cache.get(int(user_id))
     
     # Register blueprints
     register_blueprints(app)
+    init_metrics(app)
+    init_file_store(app)
+    init_avatars(app)
+    init_search(app)
     
-    # Create tables
-    with app.app_context():
-        db.create_all()
+    # The schema, search table included, comes from the migrations (flask db upgrade):
+    # importing the app does not touch the database, so workers start without a query
     
     return app
 
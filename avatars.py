@@ -0,0 +1,139 @@
+import os
+import glob
+import hashlib
+import logging
+import tempfile
+import threading
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, url_for
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AVATAR = 'default_avatar.png'
+AVATAR_SIZES = (40, 80, 160)  # Displayed at 40px and 80px, plus 2x for high-density screens
+CHUNK_SIZE = 256 * 1024
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _image_format():
+    from PIL import features
+    return ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+
+
+def avatar_filename(base, size):
+    return f'{base}_{size}.{_image_format()[1]}'
+
+
+def avatar_url(user, size=40):
+    """URL of a user's photo at the closest generated size (template global)"""
+    photo = user.profile_photo or DEFAULT_AVATAR
+    if photo == DEFAULT_AVATAR:
+        return url_for('static', filename='images/' + DEFAULT_AVATAR)
+    if '.' in photo:
+        return url_for('main.avatar', filename=photo)  # Uploaded before thumbnails existed
+    size = next((candidate for candidate in AVATAR_SIZES if candidate >= size), AVATAR_SIZES[-1])
+    return url_for('main.avatar', filename=avatar_filename(photo, size))
+
+
+def save_upload(file_storage, user_id):
+    """Copy the upload to a scratch file while hashing it; returns (path, base name)"""
+    fd, path = tempfile.mkstemp(prefix='avatar-')
+    digest = hashlib.sha256()
+    with os.fdopen(fd, 'wb') as f:
+        for chunk in iter(lambda: file_storage.stream.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            f.write(chunk)
+    return path, f'{user_id}_{digest.hexdigest()[:16]}'
+
+
+def render_thumbnails(source_path, base, folder):
+    """Write the square thumbnails of an image, without its metadata"""
+    from PIL import Image, ImageOps
+
+    image_format, extension = _image_format()
+    largest = AVATAR_SIZES[-1]
+    with Image.open(source_path) as image:
+        image.draft('RGB', (largest * 2, largest * 2))  # JPEG: decode at reduced scale
+        image = ImageOps.exif_transpose(image)  # Apply the orientation before EXIF is dropped
+        transparent = image.mode in ('RGBA', 'LA') or 'transparency' in image.info
+        image = image.convert('RGBA' if transparent and image_format == 'WEBP' else 'RGB')
+        image = ImageOps.fit(image, (largest, largest), Image.LANCZOS)
+
+        for size in AVATAR_SIZES:
+            thumbnail = image if size == largest else image.resize((size, size), Image.LANCZOS)
+            buffer = BytesIO()
+            # No exif/icc_profile arguments: the encoded file carries no metadata
+            if image_format == 'WEBP':
+                thumbnail.save(buffer, image_format, quality=82, method=6)
+            else:
+                thumbnail.save(buffer, image_format, quality=82, optimize=True, progressive=True)
+            path = os.path.join(folder, f'{base}_{size}.{extension}')
+            with open(path + '.tmp', 'wb') as f:
+                f.write(buffer.getvalue())
+            os.replace(path + '.tmp', path)
+
+
+def remove_photo_files(photo, folder):
+    """Delete the files of a previous photo (thumbnails, or a legacy original)"""
+    if not photo or photo == DEFAULT_AVATAR:
+        return
+    if '.' in photo:
+        paths = [os.path.join(folder, photo)]
+    else:
+        paths = glob.glob(os.path.join(folder, glob.escape(photo) + '_*'))
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def process_avatar(user_id, source_path, base):
+    """Build the thumbnails, then point the user at them (runs in the avatar pool)"""
+    from app import db
+    from models import User
+
+    folder = current_app.config['PROFILE_PHOTOS_FOLDER']
+    try:
+        render_thumbnails(source_path, base, folder)
+    except Exception:
+        logger.exception('Profile photo of user %s could not be processed', user_id)
+        remove_photo_files(base, folder)
+        return
+    finally:
+        os.remove(source_path)
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        remove_photo_files(base, folder)
+        return
+    previous = user.profile_photo
+    user.profile_photo = base
+    db.session.commit()
+    if previous != base:
+        remove_photo_files(previous, folder)
+
+
+def _run(app, user_id, source_path, base):
+    with app.app_context():
+        process_avatar(user_id, source_path, base)
+
+
+def submit_avatar(file_storage, user_id):
+    """Queue an uploaded photo for processing, off the request thread"""
+    global _executor
+    source_path, base = save_upload(file_storage, user_id)
+    workers = current_app.config['AVATAR_WORKERS']
+    if workers <= 0:
+        process_avatar(user_id, source_path, base)
+        return
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='avatar')
+        _executor.submit(_run, current_app._get_current_object(), user_id, source_path, base)
+
+
+def init_avatars(app):
+    app.add_template_global(avatar_url)
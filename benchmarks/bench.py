@@ -0,0 +1,331 @@
+"""Benchmark and load test for the translation routes.
+
+Runs the Flask app in-process against a throwaway SQLite database with a
+stubbed translation backend of configurable latency, then reports
+throughput and p50/p95/p99 latency per scenario as JSON:
+
+    python benchmarks/bench.py --requests 200 --concurrency 8 --output results.json
+    python benchmarks/bench.py --compare results.json   # run again and show the deltas
+"""
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import platform
+import tempfile
+import subprocess
+import threading
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ['login', 'text', 'text_fanout', 'text_spaced', 'voice', 'voice_segment', 'file_small', 'file_large', 'file_json',
+             'file_repeat', 'file_edit', 'file_fanout', 'history', 'history_api', 'statistics', 'export_csv']
+PASSWORD = 'benchmark'
+SENTENCE = 'The quick brown fox jumps over the lazy dog number {}. '
+FANOUT_TARGETS = ['es', 'de', 'it', 'pt', 'ru', 'ja', 'ko', 'zh', 'ar']  # With 'fr': every language but the source
+JOB_TIMEOUT = 300  # Seconds an uploaded file's job may take before the request counts as failed
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(durations, errors, wall_time):
+    durations = sorted(durations)
+    to_ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        'requests': len(durations),
+        'errors': errors,
+        'throughput_rps': round(len(durations) / wall_time, 2) if wall_time else None,
+        'mean_ms': to_ms(sum(durations) / len(durations)) if durations else None,
+        'p50_ms': to_ms(percentile(durations, 0.50)),
+        'p95_ms': to_ms(percentile(durations, 0.95)),
+        'p99_ms': to_ms(percentile(durations, 0.99)),
+        'max_ms': to_ms(durations[-1]) if durations else None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_app(workdir, args):
+    """Import the app configured for benchmarking, with a stub backend of fixed latency"""
+    os.environ['DATABASE_URL'] = args.database or f'sqlite:///{os.path.join(workdir, "bench.db")}'
+    os.environ['FILE_JOB_WORKERS'] = '0'  # Measure the translation itself, inline
+    os.environ['TRANSLATION_MEMORY_ENABLED'] = '1' if args.memory else '0'
+    os.environ['SINGLEFLIGHT_LOCK_DIR'] = os.path.join(workdir, 'locks')
+    if args.password_hash:
+        os.environ['PASSWORD_HASH_METHOD'] = args.password_hash
+    os.chdir(workdir)  # Upload folders are relative to the working directory
+    sys.path.insert(0, ROOT)
+
+    from app import app, db
+    from flask_migrate import upgrade
+    from translation_backends import TranslationBackend, register_backend
+
+    with app.app_context():
+        upgrade(directory=os.path.join(ROOT, 'migrations'))  # The app no longer creates its tables
+
+    class StubBackend(TranslationBackend):
+        """Pretends to call an upstream service: sleeps, then tags the text"""
+
+        name = 'bench'
+
+        def translate(self, text, source_language, target_language):
+            time.sleep(args.latency)
+            return f'[{target_language}] {text}'
+
+        def translate_batch(self, texts, source_language, target_language):
+            time.sleep(args.latency)
+            return [f'[{target_language}] {text}' for text in texts]
+
+    register_backend(StubBackend.name, StubBackend)
+    app.config.update(TRANSLATION_BACKEND=StubBackend.name, WTF_CSRF_ENABLED=False)
+    logging.disable(logging.INFO)
+    return app, db
+
+
+def seed(app, db, users, history_rows):
+    """Create one user per worker, each with history_rows translations"""
+    from werkzeug.security import generate_password_hash
+    from models import User, Translation
+
+    with app.app_context():
+        password_hash = generate_password_hash(PASSWORD, method=app.config['PASSWORD_HASH_METHOD'])
+        now = datetime.utcnow()
+        for n in range(users):
+            user = User(username=f'bench{n}', email=f'bench{n}@example.com', password_hash=password_hash)  # type: ignore
+            db.session.add(user)
+            db.session.flush()
+            db.session.add_all([Translation(  # type: ignore
+                user_id=user.id,
+                original_text=SENTENCE.format(i) * 3,
+                translated_text='[fr] ' + SENTENCE.format(i) * 3,
+                source_language='en',
+                target_language=('fr', 'es', 'de')[i % 3],
+                translation_type=('text', 'voice', 'file')[i % 3],
+                filename=f'seed_{i}.txt' if i % 3 == 2 else None,
+                created_at=now - timedelta(minutes=i)
+            ) for i in range(history_rows)])
+            db.session.commit()
+
+
+def make_requests(args):
+    """Return scenario -> function(client, n) issuing one request and returning the response"""
+    small_text = ''.join(SENTENCE.format(i) for i in range(40))
+    large_text = ''.join(SENTENCE.format(i) + ('\n\n' if i % 20 == 19 else '')
+                         for i in range(args.large_kb * 1024 // len(SENTENCE)))
+    with open(os.path.join(ROOT, 'test.json'), 'r', encoding='utf-8') as f:
+        json_document = json.load(f)
+
+    def upload(client, n, name, content, versioned=False, extra_targets=()):
+        """Upload as the page's script does, then follow the job: a rejected upload or a failed job is an error"""
+        response = client.post('/dashboard/file_translation', content_type='multipart/form-data', data={
+            'file': (io.BytesIO(content), name if versioned else f'{n}_{name}'),
+            'target_language': 'fr', 'source_language': 'en', 'extra_target_languages': list(extra_targets)
+        }, headers={'Accept': 'application/json'})
+        if response.status_code != 202:
+            raise RuntimeError(f'Upload answered HTTP {response.status_code}')
+        status_url = response.get_json()['status_url']
+        deadline = time.monotonic() + JOB_TIMEOUT
+        while True:
+            status = client.get(status_url).get_json()
+            if status['status'] not in ('pending', 'running'):
+                break
+            if time.monotonic() > deadline:
+                raise RuntimeError(f'Job still {status["status"]} after {JOB_TIMEOUT} s')
+            time.sleep(0.05)
+        failed = [job for job in status.get('jobs', [status]) if job['status'] == 'failed']
+        if failed:
+            raise RuntimeError(f'{len(failed)} job(s) failed: {failed[0]["error"]}')
+        return response
+
+    def edited_text(n):
+        # New versions of one document: a paragraph changes, the rest is reused segment by segment
+        paragraphs = large_text.split('\n\n')
+        paragraphs[n % len(paragraphs)] += f' Revision {n}.'
+        return '\n\n'.join(paragraphs)
+
+    def history_api(client, n):
+        # Walk a few pages deep through the cursor, as infinite scrolling does
+        url = '/dashboard/api/history?limit=20'
+        for _ in range(3):
+            response = client.get(url)
+            url = response.get_json().get('next_url')
+            if not url:
+                break
+        return response
+
+    return {
+        # A fresh cookie jar: logged-in clients are redirected before the password is checked
+        'login': lambda client, n: client.application.test_client().post('/auth/login', data={
+            'username': client.bench_user, 'password': PASSWORD}),
+        'text': lambda client, n: client.post('/dashboard/text_translation', data={
+            'source_text': SENTENCE.format(n) * 2, 'target_language': 'fr', 'source_language': 'auto'}),
+        'text_fanout': lambda client, n: client.post('/dashboard/text_translation', data={
+            'source_text': SENTENCE.format(n) * 2, 'target_language': 'fr', 'source_language': 'auto',
+            'extra_target_languages': FANOUT_TARGETS}),
+        # Long input whose sampled middle is whitespace only: language detection must cope
+        'text_spaced': lambda client, n: client.post('/dashboard/text_translation', data={
+            'source_text': SENTENCE.format(n) * 100 + ' ' * 6000 + SENTENCE.format(n) * 100,
+            'target_language': 'fr', 'source_language': 'auto'}),
+        'voice': lambda client, n: client.post('/dashboard/voice_translation', data={
+            'transcribed_text': SENTENCE.format(n), 'target_language': 'es'}),
+        'voice_segment': lambda client, n: client.post('/dashboard/api/voice/segment', json={
+            'text': SENTENCE.format(n), 'target_language': 'de', 'source_language': 'en'}),
+        # Contents differ per request: identical files would reuse the first translation
+        'file_small': lambda client, n: upload(client, n, 'small.txt', f'{small_text}{n}'.encode()),
+        'file_large': lambda client, n: upload(client, n, 'large.txt', f'{large_text}{n}'.encode()),
+        'file_json': lambda client, n: upload(client, n, 'test.json', json.dumps(
+            dict(json_document, request=f'Request {n}')).encode()),
+        'file_repeat': lambda client, n: upload(client, n, 'repeat.txt', small_text.encode()),
+        'file_edit': lambda client, n: upload(client, n, 'edited.txt', edited_text(n).encode(), versioned=True),
+        # One upload into 10 languages: compare with 10 times file_small
+        'file_fanout': lambda client, n: upload(client, n, 'fanout.txt', f'{small_text}{n}'.encode(),
+                                                extra_targets=FANOUT_TARGETS),
+        'history': lambda client, n: client.get('/dashboard/history'),
+        'history_api': history_api,
+        'statistics': lambda client, n: client.get('/dashboard/statistics'),
+        'export_csv': lambda client, n: client.get('/dashboard/export_history'),
+    }
+
+
+def run_scenario(clients, request, total, first=0):
+    """Issue total requests (numbered from first) spread over one thread per client"""
+    durations = []
+    errors = [0]
+    lock = threading.Lock()
+    counter = iter(range(first, first + total))
+
+    def worker(client):
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            start = time.perf_counter()
+            try:
+                response = request(client, n)
+                response.get_data()  # Drain streamed bodies
+                failed = response.status_code >= 400
+            except Exception:
+                failed = True
+            elapsed = time.perf_counter() - start
+            with lock:
+                durations.append(elapsed)
+                errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(client,)) for client in clients]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize(durations, errors[0], time.perf_counter() - start)
+
+
+def compare(results, baseline):
+    """Print the relative change of each metric against a previous run"""
+    print(f"\nvs {baseline['meta'].get('revision') or 'baseline'}:")
+    for scenario, metrics in results['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(scenario)
+        if not before:
+            continue
+        deltas = []
+        for metric in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            if metrics.get(metric) and before.get(metric):
+                deltas.append(f'{metric} {100 * (metrics[metric] - before[metric]) / before[metric]:+.1f}%')
+        print(f'  {scenario:<14} ' + '  '.join(deltas))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='comma-separated subset of: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=100, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4, help='concurrent clients (one user each)')
+    parser.add_argument('--warmup', type=int, default=5, help='unmeasured requests per scenario')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub translator latency per call, seconds')
+    parser.add_argument('--history-rows', type=int, default=1000, help='translations seeded per user')
+    parser.add_argument('--large-kb', type=int, default=256, help='size of the large .txt upload')
+    parser.add_argument('--password-hash', help='PASSWORD_HASH_METHOD to benchmark login with, e.g. scrypt:16384:8:1')
+    parser.add_argument('--memory', action='store_true', help='keep the translation memory enabled')
+    parser.add_argument('--database', help='SQLAlchemy URL (default: SQLite file in a temporary directory)')
+    parser.add_argument('--output', help='write the JSON results to this file instead of stdout')
+    parser.add_argument('--compare', help='previous JSON results to compare against')
+    args = parser.parse_args(argv)
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+
+    cwd = os.getcwd()
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+    workdir = tempfile.mkdtemp(prefix='translator-bench-')
+    try:
+        app, db = load_app(workdir, args)
+        seed(app, db, args.concurrency, args.history_rows)
+        requests = make_requests(args)
+
+        clients = []
+        for n in range(args.concurrency):
+            client = app.test_client()
+            client.bench_user = f'bench{n}'
+            client.post('/auth/login', data={'username': client.bench_user, 'password': PASSWORD})
+            clients.append(client)
+
+        results = {
+            'meta': {
+                'revision': git_revision(),
+                'timestamp': datetime.utcnow().isoformat() + 'Z',
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+                'options': {key: value for key, value in vars(args).items()
+                            if key not in ('output', 'compare', 'database')},
+            },
+            'scenarios': {},
+        }
+        for scenario in scenarios:
+            if args.warmup:
+                run_scenario(clients, requests[scenario], args.warmup)
+            results['scenarios'][scenario] = metrics = run_scenario(clients, requests[scenario], args.requests,
+                                                                    first=args.warmup)
+            print(f"{scenario:<14} {metrics['throughput_rps']:>9} req/s  p50 {metrics['p50_ms']:>9} ms  "
+                  f"p95 {metrics['p95_ms']:>9} ms  p99 {metrics['p99_ms']:>9} ms  errors {metrics['errors']}",
+                  file=sys.stderr)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if baseline_path:
+        with open(baseline_path, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+
+    return 1 if any(metrics['errors'] for metrics in results['scenarios'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,188 @@
+"""Startup benchmark: import time of the app, and gunicorn start time and memory.
+
+Measures the cold import of app.py in fresh interpreters, then starts
+gunicorn with gunicorn.conf.py twice, with and without preloading, and
+reports the time until every worker is ready and the resident (RSS) and
+proportional (PSS, shared pages split between processes) memory of the
+master and its workers:
+
+    python benchmarks/startup.py --workers 4 --output startup.json
+    python benchmarks/startup.py --compare startup.json   # run again and show the deltas
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import socket
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+import urllib.request
+
+from bench import ROOT, git_revision
+
+IMPORT_SNIPPET = ('import sys, time; sys.path.insert(0, {root!r}); started = time.perf_counter(); '
+                  'import app; print(time.perf_counter() - started)')
+WARM_UP_LINE = 'Warm-up done'
+
+
+def environment(workdir, **extra):
+    env = dict(os.environ, DATABASE_URL=f'sqlite:///{os.path.join(workdir, "startup.db")}',
+               FILE_JOB_WORKERS='0', LOG_LEVEL='info')
+    env.update(extra)
+    return env
+
+
+def migrate(workdir):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', os.path.join(ROOT, 'app.py'), 'db', 'upgrade',
+                    '-d', os.path.join(ROOT, 'migrations')],
+                   cwd=workdir, env=environment(workdir), check=True, capture_output=True)
+
+
+def measure_import(workdir, runs):
+    durations = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, '-c', IMPORT_SNIPPET.format(root=ROOT)], cwd=workdir,
+                                env=environment(workdir), check=True, capture_output=True, text=True).stdout
+        durations.append(float(output.strip().splitlines()[-1]))
+    return {'runs': runs, 'median_s': round(statistics.median(durations), 3), 'max_s': round(max(durations), 3)}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def memory_kb(pid):
+    """Rss and Pss of a process in kB, from /proc (Linux only)"""
+    values = {}
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        for line in f:
+            name, _, rest = line.partition(':')
+            if name in ('Rss', 'Pss'):
+                values[name] = int(rest.split()[0])
+    return values
+
+
+def children(pid):
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        return [int(child) for child in f.read().split()]
+
+
+def get(url):
+    with urllib.request.urlopen(url, timeout=5) as response:
+        response.read()
+        return response.status
+
+
+def measure_server(workdir, workers, preload, timeout=60):
+    """Start gunicorn, wait until every worker has warmed up and answered, then read its memory"""
+    port = free_port()
+    url = f'http://127.0.0.1:{port}/auth/login'
+    log_path = os.path.join(workdir, f'gunicorn-{"preload" if preload else "no-preload"}.log')
+    env = environment(workdir, WEB_CONCURRENCY=str(workers), GUNICORN_PRELOAD='1' if preload else '0',
+                      GUNICORN_BIND=f'127.0.0.1:{port}')
+    expected_warm_ups = 1 if preload else workers
+
+    started = time.perf_counter()
+    with open(log_path, 'w') as log:
+        server = subprocess.Popen([sys.executable, '-m', 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+                                   '--pythonpath', ROOT], cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        first_response = None
+        while True:
+            if time.perf_counter() - started > timeout or server.poll() is not None:
+                raise RuntimeError(f'gunicorn did not start, see {log_path}')
+            if first_response is None:
+                try:
+                    if get(url) == 200:
+                        first_response = time.perf_counter() - started
+                except OSError:
+                    pass
+            with open(log_path) as f:
+                warm_ups = f.read().count(WARM_UP_LINE)
+            if first_response is not None and warm_ups >= expected_warm_ups and len(children(server.pid)) >= workers:
+                ready = time.perf_counter() - started
+                break
+            time.sleep(0.05)
+
+        for _ in range(workers * 5):
+            get(url)  # Let every worker render a page or two before its memory is read
+        master = memory_kb(server.pid)
+        worker_memory = [memory_kb(pid) for pid in children(server.pid)]
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+    mean_mb = lambda key: round(statistics.mean(memory[key] for memory in worker_memory) / 1024, 1)
+    return {
+        'first_response_s': round(first_response, 3),
+        'all_workers_ready_s': round(ready, 3),
+        'master_rss_mb': round(master['Rss'] / 1024, 1),
+        'worker_rss_mb': mean_mb('Rss'),
+        'worker_pss_mb': mean_mb('Pss'),
+        'total_pss_mb': round((master['Pss'] + sum(memory['Pss'] for memory in worker_memory)) / 1024, 1),
+    }
+
+
+def compare(results, baseline):
+    """Print the relative change of each metric against a previous run"""
+    print(f"\nvs {baseline['meta'].get('revision') or 'baseline'}:")
+    pairs = [('import', results['import'], baseline.get('import', {}))]
+    pairs += [(mode, metrics, baseline.get('servers', {}).get(mode, {})) for mode, metrics in results['servers'].items()]
+    for name, metrics, before in pairs:
+        deltas = [f'{metric} {100 * (value - before[metric]) / before[metric]:+.1f}%'
+                  for metric, value in metrics.items()
+                  if isinstance(value, float) and before.get(metric)]
+        print(f'  {name:<11} ' + '  '.join(deltas))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn workers (WEB_CONCURRENCY)')
+    parser.add_argument('--import-runs', type=int, default=5, help='fresh interpreters timing the import')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='JSON file of a previous run to compare with')
+    args = parser.parse_args(argv)
+
+    if not os.path.exists('/proc/self/smaps_rollup'):
+        parser.error('memory is read from /proc/<pid>/smaps_rollup: Linux only')
+
+    workdir = tempfile.mkdtemp(prefix='translator-startup-')
+    try:
+        migrate(workdir)
+        results = {
+            'meta': {
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'cpus': os.cpu_count(),
+                'workers': args.workers,
+            },
+            'import': measure_import(workdir, args.import_runs),
+            'servers': {},
+        }
+        print(f"import        median {results['import']['median_s']} s  max {results['import']['max_s']} s")
+        for mode, preload in (('preload', True), ('no_preload', False)):
+            results['servers'][mode] = metrics = measure_server(workdir, args.workers, preload)
+            print(f"{mode:<13} ready {metrics['all_workers_ready_s']} s  worker RSS {metrics['worker_rss_mb']} MB  "
+                  f"PSS {metrics['worker_pss_mb']} MB  total PSS {metrics['total_pss_mb']} MB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            compare(results, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
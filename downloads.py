@@ -0,0 +1,63 @@
+import os
+import mimetypes
+from flask import current_app, request
+from werkzeug.utils import send_file
+
+GZIP_SUFFIX = '.gz'
+
+
+def _accel_response(path, download_name, mimetype, etag):
+    """Empty response telling nginx to serve path from its internal location"""
+    upload_root = os.path.abspath(current_app.config['UPLOAD_FOLDER'])
+    relative = os.path.relpath(os.path.abspath(path), upload_root).replace(os.sep, '/')
+    response = current_app.response_class(mimetype=mimetype)
+    response.headers['X-Accel-Redirect'] = current_app.config['DOWNLOAD_ACCEL_PREFIX'].rstrip('/') + '/' + relative
+    response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+    if etag:
+        response.set_etag(etag)
+    return response
+
+
+def send_download(path, download_name, etag=None):
+    """Send a file as an attachment without streaming it through Python when possible.
+
+    Conditional (If-None-Match) and Range requests are honoured; etag should
+    be the content hash when known. A pre-compressed '<path>.gz' is sent to
+    clients accepting gzip, and DOWNLOAD_OFFLOAD hands the transfer to the
+    front proxy (X-Sendfile or X-Accel-Redirect). Raises FileNotFoundError.
+    """
+    offload = current_app.config.get('DOWNLOAD_OFFLOAD')
+    mimetype = mimetypes.guess_type(download_name)[0] or 'application/octet-stream'
+
+    if etag and request.if_none_match.contains(etag):
+        response = current_app.response_class(status=304)
+        response.set_etag(etag)
+        return response
+
+    if offload == 'x-accel-redirect':
+        # nginx handles ranges itself, and the gzip variant with gzip_static
+        return _accel_response(path, download_name, mimetype, etag)
+
+    gzip_path = path + GZIP_SUFFIX
+    compressed = 'gzip' in request.accept_encodings and not request.range and os.path.exists(gzip_path)
+    if compressed:
+        path = gzip_path
+        etag = f'{etag}-gzip' if etag else None
+
+    response = send_file(
+        os.path.abspath(path), request.environ,
+        mimetype=mimetype,
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True,
+        etag=etag or True,
+        use_x_sendfile=offload == 'x-sendfile',
+        response_class=current_app.response_class
+    )
+    response.cache_control.no_cache = None
+    response.cache_control.private = True
+    if compressed:
+        response.headers['Content-Encoding'] = 'gzip'
+    if compressed or os.path.exists(gzip_path):
+        response.vary.add('Accept-Encoding')
+    return response
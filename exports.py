@@ -0,0 +1,117 @@
+import csv
+import json
+import zlib
+import zipfile
+from io import RawIOBase, StringIO
+
+CSV_HEADER = ['Date', 'Type', 'Langue source', 'Langue cible', 'Texte original', 'Texte traduit', 'Fichier']
+PREVIEW_LENGTH = 100
+FLUSH_EVERY = 200  # Rows buffered before a chunk is sent
+
+
+def _preview(text):
+    if len(text) <= PREVIEW_LENGTH:
+        return text
+    return text[:PREVIEW_LENGTH] + '...'
+
+
+def _texts(t, full):
+    """Original and translated text of a row; the stored previews unless full"""
+    if full:
+        return t.original_text, t.translated_text
+    return _preview(t.original_preview), _preview(t.translated_preview)
+
+
+def iter_history_csv(translations, full=False):
+    """Yield the history as CSV chunks, FLUSH_EVERY rows at a time"""
+    output = StringIO()
+    writer = csv.writer(output)
+    writer.writerow(CSV_HEADER)
+
+    for count, t in enumerate(translations, 1):
+        original_text, translated_text = _texts(t, full)
+        writer.writerow([
+            t.created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            t.translation_type,
+            t.source_language,
+            t.target_language,
+            original_text,
+            translated_text,
+            t.filename or ''
+        ])
+        if count % FLUSH_EVERY == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+
+    yield output.getvalue()
+
+
+def iter_history_jsonl(translations, full=False):
+    """Yield the history as JSON Lines, one object per translation"""
+    lines = []
+    for t in translations:
+        original_text, translated_text = _texts(t, full)
+        lines.append(json.dumps({
+            'id': t.id,
+            'created_at': t.created_at.isoformat(),
+            'updated_at': t.updated_at.isoformat() if t.updated_at else None,
+            'translation_type': t.translation_type,
+            'source_language': t.source_language,
+            'target_language': t.target_language,
+            'original_text': original_text,
+            'translated_text': translated_text,
+            'filename': t.filename
+        }, ensure_ascii=False))
+        if len(lines) >= FLUSH_EVERY:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def gzip_chunks(chunks, level=6):
+    """Compress a stream of text chunks into a gzip stream, chunk by chunk"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class _ChunkWriter(RawIOBase):
+    """Unseekable output collecting what is written until a generator takes it"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def zip_chunks(members, read_size=64 * 1024):
+    """Stream a zip archive of files, given as (name in the archive, path) pairs, block by block"""
+    output = _ChunkWriter()
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, path in members:
+            with open(path, 'rb') as source, archive.open(name, 'w', force_zip64=True) as target:
+                while True:
+                    block = source.read(read_size)
+                    if not block:
+                        break
+                    target.write(block)
+                    data = output.take()
+                    if data:
+                        yield data
+    yield output.take()
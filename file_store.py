@@ -0,0 +1,233 @@
+import os
+import gzip
+import time
+import shutil
+import hashlib
+import tempfile
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy.exc import IntegrityError
+
+CHUNK_SIZE = 1024 * 1024
+GZIP_MIN_SIZE = 1024  # Smaller files are not worth a compressed variant
+REGISTER_GRACE = 300  # Seconds an object just written by register_object is kept: its row may not be committed yet
+OBJECTS_DIR = 'objects'
+TEMP_DIR = 'tmp'
+
+files_cli = AppGroup('files', help='Stockage des fichiers traduits.')
+
+
+def object_root():
+    # Absolute: send_file() resolves relative paths against the application root
+    return os.path.abspath(os.path.join(current_app.config['UPLOAD_FOLDER'], OBJECTS_DIR))
+
+
+def object_path(key):
+    """Path of a stored object; keys are '<sha256><extension>'"""
+    return os.path.join(object_root(), key[:2], key)
+
+
+def temp_dir():
+    """Scratch directory on the same filesystem as the store, so moving files in is atomic"""
+    directory = os.path.join(object_root(), TEMP_DIR)
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+def _move_in(path, key):
+    # Replaces a stored copy of the same content too: restores one collected meanwhile, and refreshes its mtime
+    final_path = object_path(key)
+    os.makedirs(os.path.dirname(final_path), exist_ok=True)
+    os.replace(path, final_path)
+
+
+def store_stream(stream, extension):
+    """Copy a binary stream to a scratch file while hashing it; returns (key, size, path) for register_object"""
+    fd, path = tempfile.mkstemp(dir=temp_dir())
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        return digest.hexdigest() + extension.lower(), size, path
+    except BaseException:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+
+def store_file(path, extension):
+    """Hash a finished file of temp_dir(); returns (key, size, path) for register_object"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    size = os.path.getsize(path)
+    return digest.hexdigest() + extension.lower(), size, path
+
+
+def precompress(key):
+    """Write '<object>.gz' next to an object, for clients accepting gzip (see downloads)"""
+    path = object_path(key)
+    gzip_path = path + '.gz'
+    if os.path.exists(gzip_path) or os.path.getsize(path) < GZIP_MIN_SIZE:
+        return
+    fd, compressed_path = tempfile.mkstemp(dir=temp_dir())
+    with open(path, 'rb') as source, os.fdopen(fd, 'wb') as raw:
+        # mtime=0: the variant only depends on the content
+        with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=9, mtime=0) as target:
+            shutil.copyfileobj(source, target, CHUNK_SIZE)
+    if os.path.getsize(compressed_path) < os.path.getsize(path) * 0.9:
+        os.replace(compressed_path, gzip_path)
+    else:
+        os.remove(compressed_path)
+
+
+def register_object(key, size, path):
+    """Make sure the object has its row, then move the scratch file in as its content.
+
+    References are counted on flush (see models). The file is moved in even
+    when the object is already stored, so a copy the collector removed
+    meanwhile is written again.
+    """
+    from app import db
+    from models import StoredFile
+
+    if db.session.get(StoredFile, key) is None:
+        try:
+            with db.session.begin_nested():
+                db.session.add(StoredFile(key=key, size=size, ref_count=0))  # type: ignore
+        except IntegrityError:
+            pass  # Registered concurrently by another request
+    _move_in(path, key)
+    return key
+
+
+def store_upload(file_storage, extension):
+    """Store an uploaded file (werkzeug FileStorage) and return its key"""
+    return register_object(*store_stream(file_storage.stream, extension))
+
+
+def remove_objects(keys):
+    """Delete the files of collected objects, unless one was registered again meanwhile"""
+    from app import db
+    from models import StoredFile
+
+    with db.engine.connect() as connection:
+        alive = set(connection.execute(
+            db.select(StoredFile.key).where(StoredFile.key.in_(list(keys)))
+        ).scalars())
+    recent = time.time() - REGISTER_GRACE
+    for key in set(keys) - alive:
+        path = object_path(key)
+        if os.path.exists(path) and os.path.getmtime(path) > recent:
+            continue  # Registered again by a transaction not committed yet; `flask files gc` gets it otherwise
+        for path in (path, path + '.gz'):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def recount_references():
+    """Recompute every ref_count from the rows that use the objects"""
+    from app import db
+    from models import StoredFile, Translation, FileTranslationJob
+
+    counts = {}
+    references = [
+        db.select(Translation.source_file).where(Translation.source_file.isnot(None)),
+        db.select(Translation.translated_file).where(Translation.translated_file.isnot(None)),
+        db.select(FileTranslationJob.source_file).where(
+            FileTranslationJob.source_file.isnot(None),
+            FileTranslationJob.status.in_(FileTranslationJob.ACTIVE_STATUSES)
+        ),
+    ]
+    for query in references:
+        for key in db.session.execute(query).scalars():
+            counts[key] = counts.get(key, 0) + 1
+
+    for stored in StoredFile.query.all():
+        stored.ref_count = counts.pop(stored.key, 0)
+    for key, count in counts.items():
+        if os.path.exists(object_path(key)):
+            db.session.add(StoredFile(key=key, size=os.path.getsize(object_path(key)), ref_count=count))  # type: ignore
+    db.session.commit()
+
+
+def collect_garbage(recount=False, min_age=3600):
+    """Remove unreferenced objects, stray files and legacy uploads older than min_age seconds"""
+    from datetime import datetime, timedelta
+    from app import db
+    from models import StoredFile, TranslationArtifact, Translation, FileTranslationJob
+
+    if recount:
+        recount_references()
+
+    removed = {'objects': 0, 'stray': 0, 'legacy': 0}
+    cutoff = datetime.utcnow() - timedelta(seconds=min_age)
+    orphans = [key for key, in db.session.query(StoredFile.key).filter(
+        StoredFile.ref_count <= 0, StoredFile.created_at < cutoff
+    ).with_for_update()]
+    if orphans:
+        # Counted again in the deleting statement: an object referenced since the select is kept
+        orphans = list(db.session.execute(
+            db.delete(StoredFile).where(StoredFile.key.in_(orphans), StoredFile.ref_count <= 0)
+            .returning(StoredFile.key)
+        ).scalars())
+        TranslationArtifact.query.filter(db.or_(
+            TranslationArtifact.source_file.in_(orphans), TranslationArtifact.translated_file.in_(orphans)
+        )).delete(synchronize_session=False)
+    db.session.commit()
+    if orphans:
+        remove_objects(orphans)
+        removed['objects'] = len(orphans)
+
+    # Files without a row: interrupted uploads and leftovers from crashed jobs
+    known = set(db.session.execute(db.select(StoredFile.key)).scalars())
+    now = time.time()
+    root = object_root()
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(directory, name)
+            in_temp = os.path.basename(directory) == TEMP_DIR
+            key = name[:-len('.gz')] if name.endswith('.gz') else name
+            if (in_temp or key not in known) and now - os.path.getmtime(path) > min_age:
+                os.remove(path)
+                removed['stray'] += 1
+
+    # Files saved by name before content addressing
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    in_use = set(db.session.execute(
+        db.select(Translation.filename).where(Translation.filename.isnot(None), Translation.translated_file.is_(None))
+    ).scalars())
+    in_use |= set(db.session.execute(
+        db.select(FileTranslationJob.filename).where(
+            FileTranslationJob.source_file.is_(None),
+            FileTranslationJob.status.in_(FileTranslationJob.ACTIVE_STATUSES)
+        )
+    ).scalars())
+    for name in os.listdir(upload_folder):
+        path = os.path.join(upload_folder, name)
+        original = name[len('translated_'):] if name.startswith('translated_') else name
+        if os.path.isfile(path) and original not in in_use and now - os.path.getmtime(path) > min_age:
+            os.remove(path)
+            removed['legacy'] += 1
+
+    return removed
+
+
+@files_cli.command('gc')
+@click.option('--recount', is_flag=True, help='Recalculer les compteurs de références avant le nettoyage.')
+@click.option('--min-age', default=3600, show_default=True, help='Âge minimal (secondes) des fichiers supprimés.')
+def gc_command(recount, min_age):
+    """Supprime les fichiers qui ne sont plus référencés."""
+    removed = collect_garbage(recount, min_age)
+    click.echo(f"{removed['objects']} objet(s), {removed['stray']} fichier(s) orphelin(s) "
+               f"et {removed['legacy']} ancien(s) fichier(s) supprimés.")
+
+
+def init_file_store(app):
+    app.cli.add_command(files_cli)
@@ -0,0 +1,306 @@
+import os
+import re
+import json
+import hashlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from utils import translate_batch, detect_language
+
+# Split points, from the most to the least preferable
+PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+SENTENCE_BREAK = re.compile(r'[.!?\u3002\uff01\uff1f]["\')\]]?\s+|\n')
+WORD_BREAK = re.compile(r'\s+')
+NON_SPACE = re.compile(r'\S')
+BREAK_PUNCTUATION = '.!?\u3002\uff01\uff1f"\')]'
+DETECTION_PREFIX = 10000  # Characters of a file its language is detected on
+
+
+def iter_json_strings(node):
+    """Yield every translatable string leaf of a JSON document (keys are left alone)"""
+    if isinstance(node, dict):
+        for value in node.values():
+            yield from iter_json_strings(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from iter_json_strings(item)
+    elif isinstance(node, str) and node.strip():
+        yield node
+
+
+def replace_json_strings(node, translations):
+    """Rebuild a JSON document with its string leaves swapped for their translations"""
+    if isinstance(node, dict):
+        return {key: replace_json_strings(value, translations) for key, value in node.items()}
+    if isinstance(node, list):
+        return [replace_json_strings(item, translations) for item in node]
+    if isinstance(node, str):
+        return translations.get(node, node)
+    return node
+
+
+def json_source_text(content, limit=None):
+    """Concatenate the string leaves of a document, e.g. for language detection"""
+    parts = []
+    size = 0
+    for text in iter_json_strings(content):
+        parts.append(text)
+        size += len(text)
+        if limit and size >= limit:
+            break
+    return '\n'.join(parts)
+
+
+def translate_segments(texts, target_language, source_language='auto', segments=None, batch_size=50):
+    """translate_batch, except for the texts the document's SegmentStore already knows"""
+    if segments is None:
+        return translate_batch(texts, target_language, source_language, batch_size=batch_size)
+
+    results = [segments.get(text) for text in texts]
+    missing = [i for i, result in enumerate(results) if result is None]
+    if missing:
+        translated = translate_batch([texts[i] for i in missing], target_language, source_language,
+                                     batch_size=batch_size)
+        for i, translated_text in zip(missing, translated):
+            results[i] = translated_text
+            segments.add(texts[i], translated_text)
+    return results
+
+
+def translate_json(content, target_language, source_language='auto', batch_size=50, segments=None):
+    """Translate the string leaves of a JSON document while keeping its structure"""
+    unique_strings = list(dict.fromkeys(iter_json_strings(content)))
+    translated = translate_segments(unique_strings, target_language, source_language, segments, batch_size)
+    return replace_json_strings(content, dict(zip(unique_strings, translated)))
+
+
+def _split_point(buffer, max_chars):
+    """Find where to cut the buffer so that the chunk stays under max_chars"""
+    window = buffer[:max_chars]
+    for pattern in (PARAGRAPH_BREAK, SENTENCE_BREAK, WORD_BREAK):
+        cut = 0
+        for match in pattern.finditer(window):
+            cut = match.end()
+        # Ignore cuts that would leave a tiny chunk behind a huge one
+        if cut > max_chars // 4:
+            return cut
+    return max_chars
+
+
+def _final(match, text, end, eof):
+    """Whether a break can no longer grow: whitespace after it may go on in the next block"""
+    return eof or match.group() == '\n' or NON_SPACE.search(text, match.end(), end) is not None
+
+
+def _settled_end(text, start, end):
+    """End of text[start:end] without the tail that more input could turn into a break"""
+    while end > start and (text[end - 1].isspace() or text[end - 1] in BREAK_PUNCTUATION):
+        end -= 1
+    return end
+
+
+def iter_text_units(stream, max_chars=4500, read_size=64 * 1024):
+    """Read a text stream incrementally and yield its paragraphs.
+
+    Paragraphs longer than max_chars come as sentences, and sentences still
+    too long are cut at word breaks (units only exceed max_chars by trailing
+    whitespace). Cut points depend on the surrounding text only, not on
+    their offset in the file nor on read_size: an edit leaves the units
+    after it unchanged.
+    """
+    buffer = ''
+    pos = 0
+    long_paragraph = False
+    while True:
+        block = stream.read(read_size)
+        buffer = buffer[pos:] + block
+        pos = 0
+        eof = not block
+        paragraph = searched = None
+        while pos < len(buffer):
+            # Where the paragraph's text ends (None: not read yet), and where its break ends.
+            # The search is only repeated once passed: long paragraphs come out a sentence at a time
+            if searched is None or (paragraph is not None and paragraph.start() < pos):
+                paragraph = PARAGRAPH_BREAK.search(buffer, pos)
+                searched = pos
+            match = paragraph
+            if match:
+                text_end = match.start()
+                end = match.end() if _final(match, buffer, len(buffer), eof) else None
+            else:
+                text_end = end = len(buffer) if eof else None
+
+            known_end = text_end if text_end is not None else _settled_end(buffer, pos, len(buffer))
+            if not long_paragraph and known_end - pos <= max_chars:
+                if end is None:
+                    break  # Wait for the end of the paragraph
+                yield buffer[pos:end]
+                pos = end
+                continue
+
+            long_paragraph = True
+            region_end = end if end is not None else len(buffer)
+            match = SENTENCE_BREAK.search(buffer, pos, region_end)
+            if match:
+                text_end = match.start()
+                cut = match.end() if _final(match, buffer, region_end, end is not None) else None
+            else:
+                text_end = cut = end
+            known_end = text_end if text_end is not None else _settled_end(buffer, pos, region_end)
+            if known_end - pos <= max_chars:
+                if cut is None:
+                    break  # Wait for the end of the sentence
+            else:
+                cut = pos + _split_point(buffer[pos:min(region_end, pos + max_chars)], max_chars)
+            yield buffer[pos:cut]
+            pos = cut
+            if end is not None and cut >= end:
+                long_paragraph = False
+        if eof:
+            return
+
+
+def _content_boundary(unit, target_chars):
+    """Whether a segment ends after this unit, with probability len(unit) / target_chars"""
+    digest = hashlib.blake2b(unit.encode('utf-8'), digest_size=4).digest()
+    return int.from_bytes(digest, 'big') < len(unit) / target_chars * 2 ** 32
+
+
+def iter_text_segments(stream, max_chars=4500, read_size=64 * 1024):
+    """Group the units of a text stream into segments of at most max_chars.
+
+    Segments end where the content says so (see _content_boundary), or
+    before they would grow past max_chars; they average about 60% of it.
+    After an edit the following segments fall back on the same boundaries
+    as before and can be reused.
+    """
+    target_chars = max_chars
+    segment = ''
+    for unit in iter_text_units(stream, max_chars, read_size):
+        if segment and len(segment) + len(unit) > max_chars:
+            yield segment
+            segment = ''
+        segment += unit
+        if _content_boundary(unit, target_chars):
+            yield segment
+            segment = ''
+    if segment:
+        yield segment
+
+
+def read_text_prefix(filepath, size):
+    """Read at most size characters from the start of a text file"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return f.read(size)
+
+
+def detect_file_language(filepath, source_language='auto'):
+    """Language of an uploaded .txt or .json file, unless the user pinned it"""
+    if source_language != 'auto':
+        return source_language
+    if filepath.endswith('.json'):
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return detect_language(json_source_text(json.load(f), limit=DETECTION_PREFIX), source_language)
+    return detect_language(read_text_prefix(filepath, DETECTION_PREFIX), source_language)
+
+
+def translate_chunk(chunk, target_language, source_language='auto', segments=None):
+    """Translate a chunk, keeping its surrounding whitespace so the layout survives"""
+    core = chunk.strip()
+    if not core:
+        return chunk
+    start = chunk.index(core)
+    translated = translate_segments([core], target_language, source_language, segments)[0]
+    return chunk[:start] + translated + chunk[start + len(core):]
+
+
+def translate_text_file(source_path, target_path, target_language, source_language='auto',
+                        chunk_size=None, workers=None, on_progress=None, segments=None):
+    """Stream a .txt file through the translator segment by segment.
+
+    Chunks are translated concurrently by a bounded pool and written to the
+    output in their original order; at most two chunks per worker are held
+    in memory at any time, whatever the file size. Chunks found in segments
+    (a SegmentStore) are not sent upstream.
+    """
+    app = current_app._get_current_object()
+    chunk_size = chunk_size or app.config['TRANSLATION_CHUNK_SIZE']
+    workers = workers or app.config['TRANSLATION_WORKERS']
+    total_bytes = os.path.getsize(source_path)
+    processed_bytes = 0
+
+    def work(chunk):
+        with app.app_context():
+            return translate_chunk(chunk, target_language, source_language, segments)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor, \
+            open(source_path, 'r', encoding='utf-8') as source, \
+            open(target_path, 'w', encoding='utf-8') as target:
+        pending = deque()
+
+        def flush_oldest():
+            nonlocal processed_bytes
+            chunk, future = pending.popleft()
+            target.write(future.result())
+            processed_bytes += len(chunk.encode('utf-8'))
+            if on_progress:
+                on_progress(processed_bytes, total_bytes)
+
+        try:
+            for chunk in iter_text_segments(source, chunk_size):
+                pending.append((chunk, executor.submit(work, chunk)))
+                if len(pending) >= workers * 2:
+                    flush_oldest()
+            while pending:
+                flush_oldest()
+        except Exception:
+            for _, future in pending:
+                future.cancel()
+            raise
+
+
+def read_original_text(filepath):
+    """Text stored as original_text for an uploaded file (JSON is re-indented)"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        if filepath.endswith('.json'):
+            return json.dumps(json.load(f), ensure_ascii=False, indent=2)
+        return f.read()
+
+
+def translate_uploaded_file(filepath, translated_filepath, target_language, source_language='auto',
+                            on_progress=None, open_segments=None):
+    """Translate an uploaded .txt or .json file into translated_filepath.
+
+    open_segments(source_language), if given, returns the SegmentStore of
+    the document: segments it already holds are not sent upstream again.
+    Returns (original_text, translated_text, source_language).
+    """
+    if filepath.endswith('.json'):
+        # Translate only the string leaves so keys, numbers and nesting survive
+        with open(filepath, 'r', encoding='utf-8') as f:
+            content = json.load(f)
+        original_text = json.dumps(content, ensure_ascii=False, indent=2)
+
+        source_language = detect_language(json_source_text(content, limit=DETECTION_PREFIX), source_language)
+        segments = open_segments(source_language) if open_segments else None
+        translated_content = translate_json(content, target_language, source_language,
+                                            batch_size=current_app.config['TRANSLATION_BATCH_SIZE'],
+                                            segments=segments)
+        translated_text = json.dumps(translated_content, ensure_ascii=False, indent=2)
+
+        with open(translated_filepath, 'w', encoding='utf-8') as f:
+            f.write(translated_text)
+        if on_progress:
+            on_progress(1, 1)
+    else:
+        # Stream the text through the translator in chunks, detecting on a prefix only
+        source_language = detect_file_language(filepath, source_language)
+        segments = open_segments(source_language) if open_segments else None
+        translate_text_file(filepath, translated_filepath, target_language, source_language,
+                            on_progress=on_progress, segments=segments)
+
+        original_text = read_original_text(filepath)
+        with open(translated_filepath, 'r', encoding='utf-8') as f:
+            translated_text = f.read()
+
+    return original_text, translated_text, source_language
@@ -1,14 +1,23 @@
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed, FileRequired
-from wtforms import StringField, PasswordField, SelectField, TextAreaField, HiddenField
-from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
+from wtforms import StringField, PasswordField, SelectField, SelectMultipleField, TextAreaField, HiddenField
+from wtforms.validators import DataRequired, Email, EqualTo, Length, Optional
+from app import db
 from models import User
+from metrics import stage
 
-class LoginForm(FlaskForm):
+class BaseForm(FlaskForm):
+    """FlaskForm whose validation is timed by the request metrics"""
+    
+    def validate_on_submit(self, extra_validators=None):
+        with stage('form_validation'):
+            return super().validate_on_submit(extra_validators)
+
+class LoginForm(BaseForm):
     username = StringField('Nom d\'utilisateur', validators=[DataRequired()])
     password = PasswordField('Mot de passe', validators=[DataRequired()])
 
-class RegisterForm(FlaskForm):
+class RegisterForm(BaseForm):
     username = StringField('Nom d\'utilisateur', validators=[
         DataRequired(), 
         Length(min=3, max=64, message="Le nom d'utilisateur doit contenir entre 3 et 64 caractères")
@@ -23,23 +32,33 @@ class RegisterForm(FlaskForm):
         EqualTo('password', message="Les mots de passe doivent correspondre")
     ])
     
-    def validate_username(self, username):
-        user = User.query.filter_by(username=username.data).first()
-        if user:
-            raise ValidationError('Ce nom d\'utilisateur est déjà utilisé.')
-    
-    def validate_email(self, email):
-        user = User.query.filter_by(email=email.data).first()
-        if user:
-            raise ValidationError('Cette adresse email est déjà utilisée.')
+    def validate(self, extra_validators=None):
+        valid = super().validate(extra_validators)
+        if self.username.errors or self.email.errors:
+            return False
+        
+        # Both uniqueness checks in a single query
+        taken = db.session.execute(
+            db.select(User.username, User.email).where(
+                db.or_(User.username == self.username.data, User.email == self.email.data)
+            )
+        ).all()
+        if any(row.username == self.username.data for row in taken):
+            self.username.errors.append('Ce nom d\'utilisateur est déjà utilisé.')
+            valid = False
+        if any(row.email == self.email.data for row in taken):
+            self.email.errors.append('Cette adresse email est déjà utilisée.')
+            valid = False
+        return valid
 
-class ProfileForm(FlaskForm):
+class ProfileForm(BaseForm):
     username = StringField('Nom d\'utilisateur', validators=[
         DataRequired(), 
         Length(min=3, max=64)
     ])
     current_password = PasswordField('Mot de passe actuel')
     new_password = PasswordField('Nouveau mot de passe', validators=[
+        Optional(),
         Length(min=6, message="Le mot de passe doit contenir au moins 6 caractères")
     ])
     confirm_password = PasswordField('Confirmer le nouveau mot de passe', validators=[
@@ -49,7 +68,7 @@ class ProfileForm(FlaskForm):
         FileAllowed(['jpg', 'jpeg', 'png', 'gif'], 'Seules les images sont autorisées!')
     ])
 
-class VoiceTranslationForm(FlaskForm):
+class VoiceTranslationForm(BaseForm):
     target_language = SelectField('Langue cible', choices=[
         ('en', 'Anglais'),
         ('es', 'Espagnol'),
@@ -64,11 +83,41 @@ class VoiceTranslationForm(FlaskForm):
     ], validators=[DataRequired()])
     transcribed_text = HiddenField()
 
-class FileTranslationForm(FlaskForm):
+class ExtraTargetLanguagesMixin:
+    """Fan-out: the same input also translated into these languages, detected once"""
+    extra_target_languages = SelectMultipleField('Autres langues cibles', choices=[
+        ('en', 'Anglais'),
+        ('es', 'Espagnol'),
+        ('de', 'Allemand'),
+        ('it', 'Italien'),
+        ('pt', 'Portugais'),
+        ('ru', 'Russe'),
+        ('ja', 'Japonais'),
+        ('ko', 'Coréen'),
+        ('zh', 'Chinois'),
+        ('ar', 'Arabe'),
+        ('fr', 'Français')
+    ], validators=[Optional()])
+
+class FileTranslationForm(ExtraTargetLanguagesMixin, BaseForm):
     file = FileField('Fichier à traduire', validators=[
         FileRequired(),
         FileAllowed(['txt', 'json'], 'Seuls les fichiers .txt et .json sont autorisés!')
     ])
+    source_language = SelectField('Langue source', choices=[
+        ('auto', 'Détection automatique'),
+        ('fr', 'Français'),
+        ('en', 'Anglais'),
+        ('es', 'Espagnol'),
+        ('de', 'Allemand'),
+        ('it', 'Italien'),
+        ('pt', 'Portugais'),
+        ('ru', 'Russe'),
+        ('ja', 'Japonais'),
+        ('ko', 'Coréen'),
+        ('zh', 'Chinois'),
+        ('ar', 'Arabe')
+    ], default='auto')
     target_language = SelectField('Langue cible', choices=[
         ('en', 'Anglais'),
         ('es', 'Espagnol'),
@@ -83,13 +132,27 @@ class FileTranslationForm(FlaskForm):
         ('fr', 'Français')
     ], validators=[DataRequired()])
 
-class EditTranslationForm(FlaskForm):
+class EditTranslationForm(BaseForm):
     translated_text = TextAreaField('Texte traduit', validators=[DataRequired()])
 
-class TextTranslationForm(FlaskForm):
+class TextTranslationForm(ExtraTargetLanguagesMixin, BaseForm):
     source_text = TextAreaField('Texte à traduire', validators=[
         DataRequired(message="Veuillez saisir le texte à traduire")
     ], render_kw={"placeholder": "Saisissez ou collez votre texte ici...", "rows": 6})
+    source_language = SelectField('Langue source', choices=[
+        ('auto', 'Détection automatique'),
+        ('fr', 'Français'),
+        ('en', 'Anglais'),
+        ('es', 'Espagnol'),
+        ('de', 'Allemand'),
+        ('it', 'Italien'),
+        ('pt', 'Portugais'),
+        ('ru', 'Russe'),
+        ('ja', 'Japonais'),
+        ('ko', 'Coréen'),
+        ('zh', 'Chinois'),
+        ('ar', 'Arabe')
+    ], default='auto')
     target_language = SelectField('Langue cible', choices=[
         ('en', 'Anglais'),
         ('es', 'Espagnol'),
@@ -103,3 +166,8 @@ class TextTranslationForm(FlaskForm):
         ('ar', 'Arabe'),
         ('fr', 'Français')
     ], validators=[DataRequired()])
+
+def target_languages(form):
+    """Target languages of a translation form: the main one first, then the extra ones"""
+    return list(dict.fromkeys([form.target_language.data] + (form.extra_target_languages.data or [])))
+
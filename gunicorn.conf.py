@@ -0,0 +1,61 @@
+"""Production server settings: run `gunicorn` from the project directory (this file is read by default).
+
+Every setting can be overridden from the environment, see the README.
+"""
+import os
+import multiprocessing
+
+wsgi_app = 'main:app'
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', 5000)}")
+
+# Requests mostly wait on the translation service: a few processes for the CPU work
+# (detection, password hashing, compression) and threads for the waiting
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 60))  # Above a synchronous translation with its retries
+graceful_timeout = 30
+keepalive = 5  # Connections kept open for the reverse proxy
+
+# Recycling a worker also ends its file translations (they run in its own pool, see
+# worker_exit): off unless asked for; jitter so workers do not all restart together
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+# Load the app and warm it up once in the master: workers (and the ones replacing
+# them) are forked ready to serve and share that memory copy-on-write
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('LOG_LEVEL', 'info').lower()
+
+
+def when_ready(server):
+    # Runs in the master after the app was preloaded, before the workers are forked
+    if preload_app:
+        from app import app
+        from warmup import warm_up
+        warm_up(app)
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from app import app
+        from warmup import after_fork
+        after_fork(app)
+
+
+def post_worker_init(worker):
+    # Without preloading, each worker warms up its own copy before taking requests
+    if not preload_app:
+        from app import app
+        from warmup import warm_up
+        warm_up(app)
+
+
+def worker_exit(server, worker):
+    # The file jobs of this worker die with it: fail them now rather than when they go stale
+    from app import app
+    from jobs import shutdown_executor
+    shutdown_executor(app)
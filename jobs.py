@@ -0,0 +1,351 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_STEP = 5  # Minimum progress change (in %) between two database writes
+HEARTBEAT_INTERVAL = 60  # Seconds between two writes of a running job, even without progress
+REAP_INTERVAL = 60  # Seconds between two looks for stale jobs in a process
+STALE_JOB_ERROR = 'Le traitement a été interrompu (redémarrage du serveur), veuillez relancer la traduction.'
+
+_executor = None
+_executor_lock = threading.Lock()
+_queued = set()  # Ids of the jobs this process has on its pool
+_last_reap = 0.0
+
+
+def _init_worker():
+    """Give each worker process its own database connections"""
+    from app import app, db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def get_executor():
+    """Return the process pool, creating it on first use (after the server has forked)"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=current_app.config['FILE_JOB_WORKERS'],
+                initializer=_init_worker
+            )
+        return _executor
+
+
+def _submit(run, process, argument, job_ids):
+    """Run process(argument) on the worker pool, or inline when FILE_JOB_WORKERS is 0"""
+    global _executor
+    if current_app.config['FILE_JOB_WORKERS'] <= 0:
+        # No pool configured: translate inline, like before background jobs existed
+        process(argument)
+        return
+
+    try:
+        future = get_executor().submit(run, argument)
+    except BrokenProcessPool:
+        logger.warning('File job pool was broken, starting a new one')
+        with _executor_lock:
+            _executor = None
+        future = get_executor().submit(run, argument)
+    with _executor_lock:
+        _queued.update(job_ids)
+    future.add_done_callback(lambda _: _forget(job_ids))
+
+
+def _forget(job_ids):
+    with _executor_lock:
+        _queued.difference_update(job_ids)
+
+
+def shutdown_executor(app):
+    """Stop this process's pool and fail the jobs it had not finished; returns how many.
+
+    Called when a gunicorn worker exits (see gunicorn.conf.py): its jobs
+    would otherwise stay active until fail_stale_jobs notices them.
+    """
+    global _executor
+    from app import db
+    from models import FileTranslationJob
+
+    with _executor_lock:
+        executor, _executor = _executor, None
+        job_ids = list(_queued)
+    if executor is None:
+        return 0
+    executor.shutdown(wait=False, cancel_futures=True)
+    if not job_ids:
+        return 0
+
+    with app.app_context():
+        jobs = FileTranslationJob.query.filter(
+            FileTranslationJob.id.in_(job_ids), FileTranslationJob.status.in_(FileTranslationJob.ACTIVE_STATUSES)
+        ).populate_existing().with_for_update().all()
+        for job in jobs:
+            job.status = 'failed'
+            job.error = STALE_JOB_ERROR
+        db.session.commit()
+    if jobs:
+        logger.warning('%d unfinished file job(s) marked as failed on shutdown', len(jobs))
+    return len(jobs)
+
+
+def is_stale(job):
+    """True for an active job nobody updated for FILE_JOB_STALE_AFTER seconds: its worker is gone"""
+    from models import FileTranslationJob
+
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['FILE_JOB_STALE_AFTER'])
+    return job.status in FileTranslationJob.ACTIVE_STATUSES and job.updated_at < cutoff
+
+
+def fail_stale_jobs(job_ids=None):
+    """Mark the stale jobs (see is_stale) failed, among job_ids or all of them; returns how many.
+
+    Jobs live in the process pool of the web worker that queued them: they
+    are lost when it exits (crash, restart, recycling). Failing them releases
+    their upload and ends the polling of their page.
+    """
+    from app import db
+    from models import FileTranslationJob
+
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['FILE_JOB_STALE_AFTER'])
+    query = FileTranslationJob.query.filter(
+        FileTranslationJob.status.in_(FileTranslationJob.ACTIVE_STATUSES), FileTranslationJob.updated_at < cutoff
+    )
+    if job_ids is not None:
+        query = query.filter(FileTranslationJob.id.in_(list(job_ids)))
+    # Locked and re-read: a job failed twice would release its upload twice
+    jobs = query.populate_existing().with_for_update().all()
+    for job in jobs:
+        job.status = 'failed'
+        job.error = STALE_JOB_ERROR
+    db.session.commit()
+    if jobs:
+        logger.warning('%d stale file job(s) marked as failed', len(jobs))
+    return len(jobs)
+
+
+def reap_stale_jobs():
+    """fail_stale_jobs(), at most once every REAP_INTERVAL seconds in this process"""
+    global _last_reap
+    now = time.monotonic()
+    if now - _last_reap < REAP_INTERVAL:
+        return 0
+    _last_reap = now
+    return fail_stale_jobs()
+
+
+def _lock_status(job):
+    """Re-read the job's status under a row lock before changing it: fail_stale_jobs may have failed it"""
+    from app import db
+
+    db.session.refresh(job, ['status'], with_for_update=True)
+
+
+def submit_file_job(job):
+    """Queue a committed FileTranslationJob on the worker pool"""
+    reap_stale_jobs()
+    if reuse_artifact(job):
+        return
+    _submit(run_file_job, process_file_job, job.id, [job.id])
+
+
+def submit_job_group(jobs):
+    """Queue the committed jobs of one upload translated into several languages (see process_job_group)"""
+    reap_stale_jobs()
+    job_ids = [job.id for job in jobs if not reuse_artifact(job)]
+    if job_ids:
+        _submit(run_job_group, process_job_group, job_ids, job_ids)
+
+
+def reuse_artifact(job):
+    """Complete a job at once if the same file was already translated the same way"""
+    from app import db
+    from models import Translation, TranslationArtifact
+    from file_store import object_path
+    from file_translator import read_original_text
+
+    if not job.source_file:
+        return False
+    artifact = TranslationArtifact.query.filter_by(
+        source_file=job.source_file, source_language=job.source_language, target_language=job.target_language
+    ).first()
+    if artifact is None or not os.path.exists(object_path(artifact.translated_file)):
+        return False
+
+    with open(object_path(artifact.translated_file), 'r', encoding='utf-8') as f:
+        translated_text = f.read()
+    translation = Translation(  # type: ignore
+        user_id=job.user_id,
+        original_text=read_original_text(object_path(job.source_file)),
+        translated_text=translated_text,
+        source_language=artifact.detected_language,
+        target_language=job.target_language,
+        translation_type='file',
+        filename=job.filename,
+        source_file=job.source_file,
+        translated_file=artifact.translated_file
+    )
+    db.session.add(translation)
+    db.session.flush()
+
+    job.translation_id = translation.id
+    job.status = 'done'
+    job.progress = 100.0
+    db.session.commit()
+    return True
+
+
+def run_file_job(job_id):
+    """Worker process entry point"""
+    from app import app
+    with app.app_context():
+        process_file_job(job_id)
+
+
+def run_job_group(job_ids):
+    """Worker process entry point for a job group"""
+    from app import app
+    with app.app_context():
+        process_job_group(job_ids)
+
+
+def _job_filepath(job):
+    from file_store import object_path
+
+    if job.source_file:
+        return object_path(job.source_file)
+    return os.path.join(current_app.config['UPLOAD_FOLDER'], job.filename)  # Queued before content addressing
+
+
+def process_job_group(job_ids):
+    """Translate one upload into the target languages of its jobs.
+
+    The source language is detected once for the group, then every target
+    is translated in its own thread: the group takes about as long as its
+    slowest target rather than the sum of them.
+    """
+    from app import db
+    from models import FileTranslationJob
+    from file_translator import detect_file_language
+
+    job = db.session.get(FileTranslationJob, job_ids[0])
+    if job is None:
+        return
+    try:
+        source_language = detect_file_language(_job_filepath(job), job.source_language)
+    except Exception:
+        logger.exception('Language detection failed for job group %s', job.group_id)
+        source_language = None  # Each job detects on its own, and fails on its own if the file is unreadable
+    db.session.commit()  # Ends the read transaction: each job runs in a session of its own
+
+    app = current_app._get_current_object()
+
+    def work(job_id):
+        with app.app_context():
+            process_file_job(job_id, source_language)
+
+    with ThreadPoolExecutor(max_workers=len(job_ids)) as executor:
+        list(executor.map(work, job_ids))
+
+
+def process_file_job(job_id, source_language=None):
+    """Translate the job's upload, then create its Translation row and download file.
+
+    source_language, if given, is the language already detected for the
+    upload (by process_job_group) and is used instead of the job's.
+    """
+    from app import db
+    from models import FileTranslationJob, Translation, TranslationArtifact
+    from file_translator import translate_uploaded_file
+    from file_store import temp_dir, store_file, register_object, precompress
+    from segment_store import SegmentStore
+
+    job = db.session.get(FileTranslationJob, job_id, with_for_update=True)
+    if job is None or job.status != 'pending':
+        db.session.rollback()
+        return
+
+    job.status = 'running'
+    db.session.commit()
+
+    filepath = _job_filepath(job)
+    extension = os.path.splitext(filepath)[1].lower()
+    translated_filepath = os.path.join(temp_dir(), job.id + extension)
+
+    last_write = [time.monotonic()]
+
+    def on_progress(done, total):
+        progress = min(99.0, done / total * 100) if total else 99.0
+        if progress - job.progress >= PROGRESS_STEP or time.monotonic() - last_write[0] >= HEARTBEAT_INTERVAL:
+            job.progress = max(job.progress, progress)
+            job.updated_at = datetime.utcnow()  # Tells fail_stale_jobs this job is alive
+            db.session.commit()
+            last_write[0] = time.monotonic()
+
+    segments = []
+
+    def open_segments(source_language):
+        # Earlier versions of the same document: only changed segments go upstream
+        segments.append(SegmentStore(job.user_id, job.filename, source_language, job.target_language))
+        return segments[0]
+
+    try:
+        original_text, translated_text, source_language = translate_uploaded_file(
+            filepath, translated_filepath, job.target_language, source_language or job.source_language,
+            on_progress=on_progress,
+            open_segments=open_segments
+        )
+        translated_file = register_object(*store_file(translated_filepath, extension))
+        precompress(translated_file)  # Here rather than in the request that downloads it
+
+        translation = Translation(  # type: ignore
+            user_id=job.user_id,
+            original_text=original_text,
+            translated_text=translated_text,
+            source_language=source_language,
+            target_language=job.target_language,
+            translation_type='file',
+            filename=job.filename,
+            source_file=job.source_file,
+            translated_file=translated_file
+        )
+        db.session.add(translation)
+        if job.source_file and TranslationArtifact.query.filter_by(
+                source_file=job.source_file, source_language=job.source_language,
+                target_language=job.target_language).first() is None:
+            db.session.add(TranslationArtifact(  # type: ignore
+                source_file=job.source_file,
+                source_language=job.source_language,
+                target_language=job.target_language,
+                translated_file=translated_file,
+                detected_language=source_language
+            ))
+        for store in segments:
+            store.save()
+            logger.info('File job %s: %d segment(s) reused, %d translated',
+                        job_id, store.counters['reused'], store.counters['translated'])
+        db.session.flush()
+
+        _lock_status(job)
+        job.translation_id = translation.id
+        job.status = 'done'
+        job.progress = 100.0
+        db.session.commit()
+    except Exception as e:
+        logger.exception('File translation job %s failed', job_id)
+        db.session.rollback()
+        _lock_status(job)
+        job.status = 'failed'  # Releases the upload, which is collected if nothing else uses it
+        job.error = str(e)
+        db.session.commit()
+        paths = [translated_filepath] if job.source_file else [filepath, translated_filepath]
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)  # Clean up uploaded file
@@ -0,0 +1,162 @@
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict, namedtuple
+from flask import current_app, has_app_context
+from langdetect import DetectorFactory, detect_langs
+from langdetect.lang_detect_exception import LangDetectException
+
+logger = logging.getLogger(__name__)
+
+DetectionResult = namedtuple('DetectionResult', ['language', 'elapsed_ms', 'method'])
+
+DEFAULTS = {
+    'DETECTION_SAMPLE_SIZE': 3000,   # Characters actually analysed for long texts
+    'DETECTION_CACHE_SIZE': 4096,
+    'DETECTION_SEED': 0,
+    'DETECTION_SHORT_TEXT': 40,      # Below this length, require a confident guess
+    'DETECTION_MIN_PROBABILITY': 0.8,
+}
+
+MIN_LETTERS = 3  # Below this, let the translation backend guess
+
+# Scripts that identify a language on their own, checked in order, with the
+# share of letters the script needs before it decides the language
+SCRIPT_HINTS = [
+    ('ja', re.compile(r'[぀-ヿ]'), 0.05),   # Hiragana / Katakana, even among kanji
+    ('ko', re.compile(r'[가-힯]'), 0.3),    # Hangul
+    ('zh', re.compile(r'[一-鿿]'), 0.3),    # Han without kana
+    ('ar', re.compile(r'[؀-ۿ]'), 0.3),
+    ('ru', re.compile(r'[Ѐ-ӿ]'), 0.3),
+]
+
+
+def _trim_cut_words(piece, head, tail):
+    """Drop the partial words where a slice was cut (head: at its start, tail: at its end).
+
+    A slice holding a single word is kept whole, and one of whitespace only becomes ''.
+    """
+    if head:
+        parts = piece.split(None, 1)
+        piece = parts[1] if len(parts) == 2 else piece
+    if tail:
+        parts = piece.rsplit(None, 1)
+        piece = parts[0] if len(parts) == 2 else piece
+    return piece.strip()
+
+
+def sample_text(text, size):
+    """Return a bounded, stratified sample (start, middle, end) of a long text"""
+    if len(text) <= size:
+        return text
+    part = size // 3
+    middle = (len(text) - part) // 2
+    slices = [
+        _trim_cut_words(text[:part], head=False, tail=True),
+        _trim_cut_words(text[middle:middle + part], head=True, tail=True),
+        _trim_cut_words(text[-part:], head=True, tail=False)
+    ]
+    return ' '.join(piece for piece in slices if piece)
+
+
+class LanguageDetector:
+    """Bounded-cost, memoized, deterministic wrapper around langdetect"""
+
+    def __init__(self):
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._seeded = None
+        self.counters = {'calls': 0, 'cache_hits': 0, 'pinned': 0, 'total_ms': 0.0}
+
+    def preload(self):
+        """Load langdetect's language profiles now rather than on the first detection"""
+        from langdetect.detector_factory import init_factory
+        init_factory()
+
+    def _config(self, name):
+        if has_app_context():
+            return current_app.config.get(name, DEFAULTS[name])
+        return DEFAULTS[name]
+
+    def _seed(self):
+        seed = self._config('DETECTION_SEED')
+        if seed != self._seeded:
+            DetectorFactory.seed = seed
+            self._seeded = seed
+
+    def detect(self, text, source_language='auto', backend=None):
+        """Detect the language of text; a pinned source_language short-circuits detection"""
+        started = time.perf_counter()
+
+        if source_language and source_language != 'auto':
+            return self._done(source_language, started, 'pinned')
+
+        sample = sample_text(text.strip(), self._config('DETECTION_SAMPLE_SIZE'))
+        if not sample:
+            return self._done('auto', started, 'empty')
+
+        key = hashlib.sha1(f'{backend.name if backend else ""}\x00{sample}'.encode('utf-8')).hexdigest()
+        with self._lock:
+            language = self._cache.get(key)
+            if language is not None:
+                self._cache.move_to_end(key)
+        if language is not None:
+            return self._done(language, started, 'cache')
+
+        language, method = self._detect_uncached(sample, backend)
+
+        with self._lock:
+            self._cache[key] = language
+            while len(self._cache) > self._config('DETECTION_CACHE_SIZE'):
+                self._cache.popitem(last=False)
+        return self._done(language, started, method)
+
+    def _detect_uncached(self, sample, backend):
+        letters = sum(char.isalpha() for char in sample)
+        if letters < MIN_LETTERS:
+            return 'auto', 'too-short'
+
+        for language, pattern, share in SCRIPT_HINTS:
+            if len(pattern.findall(sample)) / letters >= share:
+                return language, 'script'
+
+        if backend is not None:
+            language = backend.detect(sample)
+            if language:
+                return language, 'backend'
+
+        self._seed()
+        try:
+            guesses = detect_langs(sample)
+        except LangDetectException:
+            return 'auto', 'langdetect'
+
+        best = guesses[0]
+        # Short utterances are often misdetected: only trust a confident guess
+        if len(sample) < self._config('DETECTION_SHORT_TEXT') and best.prob < self._config('DETECTION_MIN_PROBABILITY'):
+            return 'auto', 'langdetect'
+        return best.lang, 'langdetect'
+
+    def _done(self, language, started, method):
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self.counters['calls'] += 1
+            self.counters['total_ms'] += elapsed_ms
+            if method == 'cache':
+                self.counters['cache_hits'] += 1
+            elif method == 'pinned':
+                self.counters['pinned'] += 1
+        logger.debug('Language detection: %s via %s in %.2f ms', language, method, elapsed_ms)
+        return DetectionResult(language, elapsed_ms, method)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+            stats['cache_entries'] = len(self._cache)
+        stats['average_ms'] = round(stats['total_ms'] / stats['calls'], 3) if stats['calls'] else 0
+        return stats
+
+
+language_detector = LanguageDetector()
@@ -0,0 +1,224 @@
+import hmac
+import time
+import random
+import threading
+from contextlib import contextmanager
+from flask import g, request, current_app, has_app_context, abort
+from flask.signals import before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=''):
+    labels = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram, one series per label set"""
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._series.items())
+        for label_values, (counts, total, count) in series:
+            for bound, bucket_count in zip(self.buckets, counts):
+                labels = _format_labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f'{self.name}_bucket{labels} {bucket_count}')
+            labels = _format_labels(self.labels, label_values, 'le="+Inf"')
+            lines.append(f'{self.name}_bucket{labels} {count}')
+            labels = _format_labels(self.labels, label_values)
+            lines.append(f'{self.name}_sum{labels} {total}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+REQUEST_DURATION = Histogram('translator_request_duration_seconds', 'Time spent handling a request.',
+                             ('route', 'method', 'status'))
+STAGE_DURATION = Histogram('translator_stage_duration_seconds', 'Time spent per stage of a sampled request.',
+                           ('route', 'stage'))
+SQL_QUERIES = Histogram('translator_sql_queries_per_request', 'SQL statements executed by a sampled request.',
+                        ('route',), QUERY_BUCKETS)
+HISTOGRAMS = (REQUEST_DURATION, STAGE_DURATION, SQL_QUERIES)
+
+
+class RequestMetrics:
+    """Stage timings and query count of one sampled request"""
+
+    def __init__(self):
+        self.stages = {}
+        self.queries = 0
+        self.commit_started = None
+        self.render_started = None
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+
+def _sampled():
+    if not has_app_context():
+        return None
+    return g.get('request_metrics')
+
+
+@contextmanager
+def stage(name):
+    """Time a block of the current request under a stage name (no-op if not sampled)"""
+    metrics = _sampled()
+    if metrics is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.add(name, time.perf_counter() - started)
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    metrics = _sampled()
+    if metrics is not None:
+        metrics.queries += 1
+
+
+@event.listens_for(Session, 'before_commit')
+def _commit_started(session):
+    metrics = _sampled()
+    if metrics is not None:
+        metrics.commit_started = time.perf_counter()
+
+
+@event.listens_for(Session, 'after_commit')
+def _commit_finished(session):
+    metrics = _sampled()
+    if metrics is not None and metrics.commit_started is not None:
+        metrics.add('db_commit', time.perf_counter() - metrics.commit_started)
+        metrics.commit_started = None
+
+
+def _render_started(sender, template, context, **extra):
+    metrics = _sampled()
+    if metrics is not None:
+        metrics.render_started = time.perf_counter()
+
+
+def _render_finished(sender, template, context, **extra):
+    metrics = _sampled()
+    if metrics is not None and metrics.render_started is not None:
+        metrics.add('template_render', time.perf_counter() - metrics.render_started)
+        metrics.render_started = None
+
+
+def _route():
+    return request.endpoint or 'unmatched'
+
+
+def _before_request():
+    g.request_started = time.perf_counter()
+    if random.random() < current_app.config['METRICS_SAMPLE_RATE']:
+        g.request_metrics = RequestMetrics()
+
+
+def _after_request(response):
+    started = g.pop('request_started', None)
+    if started is None:
+        return response
+    route = _route()
+    REQUEST_DURATION.observe(time.perf_counter() - started, route, request.method, str(response.status_code))
+
+    metrics = g.pop('request_metrics', None)
+    if metrics is not None:
+        for name, seconds in metrics.stages.items():
+            STAGE_DURATION.observe(seconds, route, name)
+        SQL_QUERIES.observe(metrics.queries, route)
+    return response
+
+
+def _process_counters():
+    """Counters of the in-process caches, exposed next to the histograms"""
+    from translation_memory import translation_memory
+    from language_detection import language_detector
+    from singleflight import translation_flights
+    from user_cache import user_cache
+
+    counters = [
+        ('translator_translation_memory_events_total', 'Translation memory lookups and stores.', 'event',
+         {key: value for key, value in translation_memory.stats().items() if key in translation_memory.counters}),
+        ('translator_language_detection_events_total', 'Language detection calls.', 'event',
+         {key: value for key, value in language_detector.stats().items() if key in ('calls', 'cache_hits', 'pinned')}),
+        ('translator_singleflight_calls_total', 'Translations led or coalesced by the single-flight layer.', 'role',
+         {key: value for key, value in translation_flights.stats().items() if key in translation_flights.counters}),
+        ('translator_user_cache_events_total', 'Authenticated user lookups served from or missing the user cache.', 'event',
+         {key: value for key, value in user_cache.stats().items() if key in user_cache.counters}),
+    ]
+    lines = []
+    for name, documentation, label, values in counters:
+        lines += [f'# HELP {name} {documentation}', f'# TYPE {name} counter']
+        lines += [f'{name}{{{label}="{key}"}} {value}' for key, value in sorted(values.items())]
+    return lines
+
+
+def render_metrics():
+    """Prometheus text exposition of this process' metrics"""
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.expose()
+    lines += _process_counters()
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view():
+    token = current_app.config.get('METRICS_TOKEN')
+    if not token:
+        # Without a token the endpoint is only served by the debug server
+        if not current_app.debug:
+            abort(404)
+    elif not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return 'Unauthorized\n', 401, {'Content-Type': 'text/plain; charset=utf-8'}
+    return render_metrics(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+def init_metrics(app):
+    """Install the request hooks and the /metrics endpoint"""
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
@@ -0,0 +1,100 @@
+"""Translation memory, statistics and file job tables; composite indexes for translation history
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 06:20:59.031952
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def _has_table(table):
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade():
+    # Guarded: databases created by db.create_all() may already have these
+    op.create_table('translation_memory',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('key_hash', sa.String(length=64), nullable=False),
+    sa.Column('source_text', sa.Text(), nullable=False),
+    sa.Column('source_language', sa.String(length=10), nullable=False),
+    sa.Column('target_language', sa.String(length=10), nullable=False),
+    sa.Column('translated_text', sa.Text(), nullable=False),
+    sa.Column('hit_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('last_used_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_translation_memory_created_at', 'translation_memory', ['created_at'],
+                    unique=False, if_not_exists=True)
+    op.create_index('ix_translation_memory_key_hash', 'translation_memory', ['key_hash'],
+                    unique=True, if_not_exists=True)
+    op.create_index('ix_translation_memory_last_used_at', 'translation_memory', ['last_used_at'],
+                    unique=False, if_not_exists=True)
+
+    new_stats = not _has_table('translation_stat')
+    op.create_table('translation_stat',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('translation_type', sa.String(length=20), nullable=False),
+    sa.Column('target_language', sa.String(length=10), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'translation_type', 'target_language', name='uq_translation_stat_bucket'),
+    if_not_exists=True
+    )
+    op.create_index('ix_translation_stat_user_id', 'translation_stat', ['user_id'],
+                    unique=False, if_not_exists=True)
+    if new_stats:
+        # Summary rows of the existing history, in one GROUP BY
+        op.execute(
+            'INSERT INTO translation_stat (user_id, translation_type, target_language, count) '
+            'SELECT user_id, translation_type, target_language, COUNT(id) FROM translation '
+            'GROUP BY user_id, translation_type, target_language'
+        )
+
+    op.create_table('file_translation_job',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(length=200), nullable=False),
+    sa.Column('source_language', sa.String(length=10), nullable=False),
+    sa.Column('target_language', sa.String(length=10), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('progress', sa.Float(), nullable=False),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('translation_id', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['translation_id'], ['translation.id'], ondelete='SET NULL'),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_file_translation_job_user_id', 'file_translation_job', ['user_id'],
+                    unique=False, if_not_exists=True)
+
+    op.create_index('ix_translation_user_created', 'translation', ['user_id', 'created_at', 'id'],
+                    unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_translation_user_created', table_name='translation', if_exists=True)
+    op.drop_index('ix_file_translation_job_user_id', table_name='file_translation_job', if_exists=True)
+    op.drop_table('file_translation_job')
+    op.drop_index('ix_translation_stat_user_id', table_name='translation_stat', if_exists=True)
+    op.drop_table('translation_stat')
+    op.drop_index('ix_translation_memory_last_used_at', table_name='translation_memory', if_exists=True)
+    op.drop_index('ix_translation_memory_key_hash', table_name='translation_memory', if_exists=True)
+    op.drop_index('ix_translation_memory_created_at', table_name='translation_memory', if_exists=True)
+    op.drop_table('translation_memory')
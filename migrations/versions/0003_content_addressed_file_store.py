@@ -0,0 +1,64 @@
+"""Content-addressed file store
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 06:36:55.428411
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def _columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    # Guarded: databases created by db.create_all() may already have these
+    op.create_table('stored_file',
+    sa.Column('key', sa.String(length=80), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=True),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('key'),
+    if_not_exists=True
+    )
+    op.create_table('translation_artifact',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('source_file', sa.String(length=80), nullable=False),
+    sa.Column('source_language', sa.String(length=10), nullable=False),
+    sa.Column('target_language', sa.String(length=10), nullable=False),
+    sa.Column('translated_file', sa.String(length=80), nullable=False),
+    sa.Column('detected_language', sa.String(length=10), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('source_file', 'source_language', 'target_language', name='uq_translation_artifact'),
+    if_not_exists=True
+    )
+    if 'source_file' not in _columns('file_translation_job'):
+        with op.batch_alter_table('file_translation_job', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('source_file', sa.String(length=80), nullable=True))
+
+    if 'source_file' not in _columns('translation'):
+        with op.batch_alter_table('translation', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('source_file', sa.String(length=80), nullable=True))
+            batch_op.add_column(sa.Column('translated_file', sa.String(length=80), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('translation', schema=None) as batch_op:
+        batch_op.drop_column('translated_file')
+        batch_op.drop_column('source_file')
+
+    with op.batch_alter_table('file_translation_job', schema=None) as batch_op:
+        batch_op.drop_column('source_file')
+
+    op.drop_table('translation_artifact')
+    op.drop_table('stored_file')
@@ -0,0 +1,28 @@
+"""Full-text search index over translation history
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 09:12:40.517203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 on SQLite, tsvector + GIN on PostgreSQL, nothing elsewhere (LIKE
+    # fallback). Filled from the existing rows when created here.
+    from search import create_search_index
+    create_search_index(op.get_bind())
+
+
+def downgrade():
+    from search import drop_search_index
+    drop_search_index(op.get_bind())
@@ -0,0 +1,41 @@
+"""Segment store for re-uploaded files
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 06:50:30.396224
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Guarded: databases created by db.create_all() may already have it
+    op.create_table('file_segment',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(length=200), nullable=False),
+    sa.Column('source_language', sa.String(length=10), nullable=False),
+    sa.Column('target_language', sa.String(length=10), nullable=False),
+    sa.Column('segment_hash', sa.String(length=64), nullable=False),
+    sa.Column('translated_text', sa.Text(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_file_segment_document', 'file_segment',
+                    ['user_id', 'filename', 'source_language', 'target_language', 'segment_hash'],
+                    unique=True, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_file_segment_document', table_name='file_segment', if_exists=True)
+    op.drop_table('file_segment')
@@ -0,0 +1,54 @@
+"""Preview columns for the history list views
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 09:12:41.508317
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+PREVIEW_LENGTH = 500
+BATCH_SIZE = 1000  # Rows filled per UPDATE, so large histories are not rewritten in one statement
+
+
+def _columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    # Guarded: databases created by db.create_all() may already have these
+    if 'original_preview' in _columns('translation'):
+        return
+    with op.batch_alter_table('translation', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('original_preview', sa.String(length=PREVIEW_LENGTH),
+                                      nullable=False, server_default=''))
+        batch_op.add_column(sa.Column('translated_preview', sa.String(length=PREVIEW_LENGTH),
+                                      nullable=False, server_default=''))
+
+    connection = op.get_bind()
+    translation = sa.table('translation', sa.column('id'), sa.column('original_text'), sa.column('translated_text'),
+                           sa.column('original_preview'), sa.column('translated_preview'))
+    low, high = connection.execute(sa.select(sa.func.min(translation.c.id), sa.func.max(translation.c.id))).one()
+    if low is None:
+        return
+    for start in range(low, high + 1, BATCH_SIZE):
+        connection.execute(
+            translation.update()
+            .where(translation.c.id.between(start, start + BATCH_SIZE - 1))
+            .values(original_preview=sa.func.substr(translation.c.original_text, 1, PREVIEW_LENGTH),
+                    translated_preview=sa.func.substr(translation.c.translated_text, 1, PREVIEW_LENGTH))
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('translation', schema=None) as batch_op:
+        batch_op.drop_column('translated_preview')
+        batch_op.drop_column('original_preview')
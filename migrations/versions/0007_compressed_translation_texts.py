@@ -0,0 +1,27 @@
+"""Compress large translation texts
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 10:03:17.224905
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The column type does not change (compressed values are still text):
+    # existing rows are rewritten in batches, those over the size threshold
+    from text_compression import compress_translations
+    compress_translations(op.get_bind())
+
+
+def downgrade():
+    from text_compression import decompress_translations
+    decompress_translations(op.get_bind())
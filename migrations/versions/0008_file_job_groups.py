@@ -0,0 +1,35 @@
+"""File job groups for multi-target uploads
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18 10:41:52.631078
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+
+def _columns(table):
+    return {column['name'] for column in sa.inspect(op.get_bind()).get_columns(table)}
+
+
+def upgrade():
+    # Guarded: databases created by db.create_all() may already have it
+    if 'group_id' in _columns('file_translation_job'):
+        return
+    with op.batch_alter_table('file_translation_job', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('group_id', sa.String(length=32), nullable=True))
+        batch_op.create_index('ix_file_translation_job_group_id', ['group_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('file_translation_job', schema=None) as batch_op:
+        batch_op.drop_index('ix_file_translation_job_group_id')
+        batch_op.drop_column('group_id')
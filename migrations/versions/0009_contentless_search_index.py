@@ -0,0 +1,40 @@
+"""Contentless full-text search index
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 14:05:12.340117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+# The FTS5 table as 0004 first created it, keeping its own copy of every text
+REGULAR_FTS5 = ("CREATE VIRTUAL TABLE {table} USING fts5("
+                "owner, original_text, translated_text, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')")
+
+
+def upgrade():
+    # Only SQLite tables built before are rebuilt (the _content shadow table holds the copy);
+    # PostgreSQL never stored the texts in its index
+    from search import SEARCH_TABLE, create_search_index, drop_search_index
+    connection = op.get_bind()
+    if connection.dialect.name == 'sqlite' and sa.inspect(connection).has_table(f'{SEARCH_TABLE}_content'):
+        drop_search_index(connection)
+        create_search_index(connection)
+
+
+def downgrade():
+    from search import SEARCH_TABLE, drop_search_index, index_translations
+    connection = op.get_bind()
+    if connection.dialect.name == 'sqlite' and sa.inspect(connection).has_table(SEARCH_TABLE):
+        drop_search_index(connection)
+        connection.exec_driver_sql(REGULAR_FTS5.format(table=SEARCH_TABLE))
+        index_translations(connection, clear=False)
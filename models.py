@@ -1,7 +1,22 @@
+import uuid
 from datetime import datetime
 from app import db
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, deferred, validates
+from flask import current_app, has_app_context
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from text_compression import CompressedText
+
+DEFAULT_PASSWORD_HASH_METHOD = 'scrypt'  # werkzeug's default cost (scrypt:32768:8:1)
+STATS_REBUILD_ATTEMPTS = 3
+PREVIEW_LENGTH = 500  # Characters of each text kept for list views (the job status shows the most)
+
+def password_hash_method():
+    if has_app_context():
+        return current_app.config.get('PASSWORD_HASH_METHOD', DEFAULT_PASSWORD_HASH_METHOD)
+    return DEFAULT_PASSWORD_HASH_METHOD
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -15,27 +30,48 @@ class User(UserMixin, db.Model):
     translations = db.relationship('Translation', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=password_hash_method())
     
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
     
+    def password_needs_rehash(self):
+        """True if the stored hash was made with another method or cost than PASSWORD_HASH_METHOD"""
+        stored_method = self.password_hash.split('$', 1)[0]
+        return not (stored_method + ':').startswith(password_hash_method() + ':')
+    
     def get_translation_stats(self):
-        """Get user translation statistics"""
-        total = self.translations.count()
-        voice_count = self.translations.filter_by(translation_type='voice').count()
-        file_count = self.translations.filter_by(translation_type='file').count()
+        """Get user translation statistics from the per-user summary table"""
+        rows = TranslationStat.query.with_entities(
+            TranslationStat.translation_type, TranslationStat.target_language, TranslationStat.count
+        ).filter_by(user_id=self.id).all()
+        if not rows:
+            # No summary yet (e.g. no translations): count directly, without writing from a read path.
+            # The summary rows are created by the next flush that adds a translation for this user
+            rows = db.session.execute(
+                db.select(Translation.translation_type, Translation.target_language, db.func.count(Translation.id))
+                .where(Translation.user_id == self.id)
+                .group_by(Translation.translation_type, Translation.target_language)
+            ).all()
+        
+        type_counts = {}
+        language_counts = {}
+        for translation_type, target_language, count in rows:
+            type_counts[translation_type] = type_counts.get(translation_type, 0) + count
+            language_counts[target_language] = language_counts.get(target_language, 0) + count
+        
+        total = sum(type_counts.values())
+        voice_count = type_counts.get('voice', 0)
+        file_count = type_counts.get('file', 0)
         
         voice_percentage = (voice_count / total * 100) if total > 0 else 0
         file_percentage = (file_count / total * 100) if total > 0 else 0
         
         # Get top 3 languages
-        language_stats = db.session.query(
-            Translation.target_language,
-            db.func.count(Translation.id).label('count')
-        ).filter_by(user_id=self.id).group_by(
-            Translation.target_language
-        ).order_by(db.desc('count')).limit(3).all()
+        language_stats = sorted(
+            ((language, count) for language, count in language_counts.items() if count > 0),
+            key=lambda item: (-item[1], item[0])
+        )[:3]
         
         return {
             'total': total,
@@ -47,16 +83,382 @@ class User(UserMixin, db.Model):
         }
 
 class Translation(db.Model):
+    __table_args__ = (
+        # History, statistics and export all read one user's rows newest first;
+        # id breaks ties between rows created in the same instant (keyset paging)
+        db.Index('ix_translation_user_created', 'user_id', 'created_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    original_text = db.Column(db.Text, nullable=False)
-    translated_text = db.Column(db.Text, nullable=False)
+    # Full texts can be whole documents: loaded together on first access only, stored compressed when large
+    original_text = deferred(db.Column(CompressedText, nullable=False), group='text')
+    translated_text = deferred(db.Column(CompressedText, nullable=False), group='text')
+    # Their first PREVIEW_LENGTH characters, kept in sync by _set_preview, for list views
+    original_preview = db.Column(db.String(PREVIEW_LENGTH), nullable=False, default='')
+    translated_preview = db.Column(db.String(PREVIEW_LENGTH), nullable=False, default='')
     source_language = db.Column(db.String(10), nullable=False)
     target_language = db.Column(db.String(10), nullable=False)
     translation_type = db.Column(db.String(20), nullable=False)  # 'voice' or 'file'
     filename = db.Column(db.String(200))  # For file translations
+    source_file = db.Column(db.String(80))  # StoredFile keys of the upload and the translated file
+    translated_file = db.Column(db.String(80))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    @validates('original_text', 'translated_text')
+    def _set_preview(self, key, value):
+        preview = key.replace('_text', '_preview')
+        setattr(self, preview, value[:PREVIEW_LENGTH] if value is not None else '')
+        return value
+    
     def __repr__(self):
         return f'<Translation {self.id}: {self.source_language} -> {self.target_language}>'
+
+class TranslationMemoryEntry(db.Model):
+    __tablename__ = 'translation_memory'
+
+    id = db.Column(db.Integer, primary_key=True)
+    key_hash = db.Column(db.String(64), unique=True, nullable=False, index=True)  # sha256 of (backend, source, target, exact text)
+    source_text = db.Column(db.Text, nullable=False)
+    source_language = db.Column(db.String(10), nullable=False)
+    target_language = db.Column(db.String(10), nullable=False)
+    translated_text = db.Column(db.Text, nullable=False)
+    hit_count = db.Column(db.Integer, default=0, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<TranslationMemoryEntry {self.id}: {self.source_language} -> {self.target_language}>'
+
+class FileTranslationJob(db.Model):
+    __tablename__ = 'file_translation_job'
+
+    ACTIVE_STATUSES = ('pending', 'running')
+
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    filename = db.Column(db.String(200), nullable=False)
+    source_file = db.Column(db.String(80))  # StoredFile key, referenced while the job is active
+    source_language = db.Column(db.String(10), nullable=False, default='auto')  # 'auto' means detect
+    target_language = db.Column(db.String(10), nullable=False)
+    group_id = db.Column(db.String(32), index=True)  # Shared by the jobs of one upload translated into several languages
+    status = db.Column(db.String(20), nullable=False, default='pending')  # 'pending', 'running', 'done' or 'failed'
+    progress = db.Column(db.Float, nullable=False, default=0.0)  # Percentage
+    error = db.Column(db.Text)
+    translation_id = db.Column(db.Integer, db.ForeignKey('translation.id', ondelete='SET NULL'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    translation = db.relationship('Translation')
+
+    def __repr__(self):
+        return f'<FileTranslationJob {self.id}: {self.status} {self.progress:.0f}%>'
+
+class StoredFile(db.Model):
+    """Content-addressed file under uploads/objects, shared by every row that references it"""
+    __tablename__ = 'stored_file'
+
+    key = db.Column(db.String(80), primary_key=True)  # sha256 of the content + extension
+    size = db.Column(db.BigInteger)
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StoredFile {self.key}: {self.ref_count} ref(s)>'
+
+class TranslationArtifact(db.Model):
+    """Translated file already produced for an upload, reused when the same file comes back"""
+    __tablename__ = 'translation_artifact'
+    __table_args__ = (
+        db.UniqueConstraint('source_file', 'source_language', 'target_language', name='uq_translation_artifact'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    source_file = db.Column(db.String(80), nullable=False)
+    source_language = db.Column(db.String(10), nullable=False)  # As requested ('auto' or pinned)
+    target_language = db.Column(db.String(10), nullable=False)
+    translated_file = db.Column(db.String(80), nullable=False)
+    detected_language = db.Column(db.String(10), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<TranslationArtifact {self.source_file} -> {self.target_language}>'
+
+class FileSegment(db.Model):
+    """Translation of one segment of a user's document, reused when a new version of it is uploaded"""
+    __tablename__ = 'file_segment'
+    __table_args__ = (
+        db.Index('ix_file_segment_document', 'user_id', 'filename', 'source_language', 'target_language',
+                 'segment_hash', unique=True),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    filename = db.Column(db.String(200), nullable=False)  # Same as Translation.filename
+    source_language = db.Column(db.String(10), nullable=False)  # Detected or pinned, never 'auto'
+    target_language = db.Column(db.String(10), nullable=False)
+    segment_hash = db.Column(db.String(64), nullable=False)  # sha256 of the source segment
+    translated_text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<FileSegment {self.filename} {self.segment_hash[:8]} -> {self.target_language}>'
+
+class TranslationStat(db.Model):
+    """Per-user translation counters by (type, target language), kept up to date on every flush"""
+    __tablename__ = 'translation_stat'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'translation_type', 'target_language', name='uq_translation_stat_bucket'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False, index=True)
+    translation_type = db.Column(db.String(20), nullable=False)
+    target_language = db.Column(db.String(10), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<TranslationStat user {self.user_id}: {self.translation_type}/{self.target_language}={self.count}>'
+
+
+def rebuild_translation_stats(connection, user_ids):
+    """Recompute the summary rows of some users with one GROUP BY over their translations"""
+    stats = TranslationStat.__table__
+    translations = Translation.__table__
+    connection.execute(stats.delete().where(stats.c.user_id.in_(user_ids)))
+    connection.execute(stats.insert().from_select(
+        ['user_id', 'translation_type', 'target_language', 'count'],
+        db.select(
+            translations.c.user_id,
+            translations.c.translation_type,
+            translations.c.target_language,
+            db.func.count(translations.c.id)
+        ).where(translations.c.user_id.in_(user_ids)).group_by(
+            translations.c.user_id, translations.c.translation_type, translations.c.target_language
+        )
+    ))
+
+
+def _rebuild_translation_stats_safely(connection, user_ids):
+    """rebuild_translation_stats in a savepoint, retried if a concurrent first flush inserted the same buckets.
+
+    Under READ COMMITTED the retry sees the other transaction's committed
+    translations and summary rows, so the rebuilt counts include both.
+    """
+    for attempt in range(STATS_REBUILD_ATTEMPTS):
+        try:
+            with connection.begin_nested():
+                rebuild_translation_stats(connection, user_ids)
+            return
+        except IntegrityError:
+            if attempt == STATS_REBUILD_ATTEMPTS - 1:
+                raise
+
+
+def _insert_bucket(connection):
+    """INSERT of a summary row adding to the count of a bucket inserted concurrently, where supported"""
+    stats = TranslationStat.__table__
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif connection.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return stats.insert()
+    statement = insert(stats)
+    return statement.on_conflict_do_update(
+        index_elements=['user_id', 'translation_type', 'target_language'],
+        set_={'count': stats.c.count + statement.excluded.count}
+    )
+
+
+def _stat_bucket(translation, attribute=None):
+    """(user_id, type, language) of a translation, optionally as it was before this flush"""
+    values = []
+    for name in ('user_id', 'translation_type', 'target_language'):
+        if name == attribute or attribute == '*':
+            history = db.inspect(translation).attrs[name].history
+            values.append(history.deleted[0] if history.deleted else getattr(translation, name))
+        else:
+            values.append(getattr(translation, name))
+    return tuple(values)
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_translation_stats(session, flush_context):
+    deltas = {}
+
+    def add(bucket, amount):
+        deltas[bucket] = deltas.get(bucket, 0) + amount
+
+    for obj in session.new:
+        if isinstance(obj, Translation):
+            add(_stat_bucket(obj), 1)
+    for obj in session.deleted:
+        if isinstance(obj, Translation):
+            add(_stat_bucket(obj, '*'), -1)
+    for obj in session.dirty:
+        if isinstance(obj, Translation) and obj not in session.deleted:
+            state = db.inspect(obj)
+            if any(state.attrs[name].history.has_changes()
+                   for name in ('user_id', 'translation_type', 'target_language')):
+                add(_stat_bucket(obj, '*'), -1)
+                add(_stat_bucket(obj), 1)
+
+    deltas = {bucket: amount for bucket, amount in deltas.items() if amount}
+    if not deltas:
+        return
+
+    connection = session.connection()
+    stats = TranslationStat.__table__
+    user_ids = {bucket[0] for bucket in deltas}
+    known_users = set(connection.execute(
+        db.select(stats.c.user_id).where(stats.c.user_id.in_(user_ids)).distinct()
+    ).scalars())
+
+    # Users without summary rows yet get a full rebuild, which already includes this flush
+    if user_ids - known_users:
+        _rebuild_translation_stats_safely(connection, list(user_ids - known_users))
+
+    for (user_id, translation_type, target_language), amount in deltas.items():
+        if user_id not in known_users:
+            continue
+        bucket = (stats.c.user_id == user_id) & (stats.c.translation_type == translation_type) & \
+            (stats.c.target_language == target_language)
+        updated = connection.execute(
+            stats.update().where(bucket).values(count=stats.c.count + amount)
+        ).rowcount
+        if not updated and amount > 0:
+            connection.execute(_insert_bucket(connection).values(
+                user_id=user_id, translation_type=translation_type,
+                target_language=target_language, count=amount
+            ))
+
+
+def _file_references(obj, previous=False):
+    """StoredFile keys held by a row (as of before this flush if previous)"""
+    if isinstance(obj, Translation):
+        names = ('source_file', 'translated_file')
+    elif isinstance(obj, FileTranslationJob):
+        # Jobs hold their upload only until they finish
+        status = obj.status
+        if previous:
+            history = db.inspect(obj).attrs.status.history
+            status = history.deleted[0] if history.deleted else status
+        if status not in FileTranslationJob.ACTIVE_STATUSES:
+            return []
+        names = ('source_file',)
+    else:
+        return []
+
+    keys = []
+    for name in names:
+        value = getattr(obj, name)
+        if previous:
+            history = db.inspect(obj).attrs[name].history
+            value = history.deleted[0] if history.deleted else value
+        if value:
+            keys.append(value)
+    return keys
+
+
+@event.listens_for(Session, 'after_flush')
+def _count_file_references(session, flush_context):
+    deltas = {}
+    for obj in session.new:
+        for key in _file_references(obj):
+            deltas[key] = deltas.get(key, 0) + 1
+    for obj in session.deleted:
+        for key in _file_references(obj, previous=True):
+            deltas[key] = deltas.get(key, 0) - 1
+    for obj in session.dirty:
+        if obj not in session.deleted and isinstance(obj, (Translation, FileTranslationJob)):
+            for key in _file_references(obj, previous=True):
+                deltas[key] = deltas.get(key, 0) - 1
+            for key in _file_references(obj):
+                deltas[key] = deltas.get(key, 0) + 1
+
+    deltas = {key: amount for key, amount in deltas.items() if amount}
+    if not deltas:
+        return
+
+    connection = session.connection()
+    files = StoredFile.__table__
+    for key, amount in deltas.items():
+        updated = connection.execute(
+            files.update().where(files.c.key == key).values(ref_count=files.c.ref_count + amount)
+        ).rowcount
+        if not updated and amount > 0:
+            # Collected by a concurrent transaction after this one registered it
+            connection.execute(files.insert().values(key=key, ref_count=amount, created_at=datetime.utcnow()))
+
+    # Objects nobody references any more are collected; their files go once this commits
+    orphans = list(connection.execute(
+        db.select(files.c.key).where(files.c.key.in_(list(deltas)), files.c.ref_count <= 0)
+    ).scalars())
+    if orphans:
+        artifacts = TranslationArtifact.__table__
+        connection.execute(artifacts.delete().where(db.or_(
+            artifacts.c.source_file.in_(orphans), artifacts.c.translated_file.in_(orphans)
+        )))
+        connection.execute(files.delete().where(files.c.key.in_(orphans)))
+        session.info.setdefault('orphaned_files', set()).update(orphans)
+
+
+@event.listens_for(Session, 'after_commit')
+def _remove_orphaned_files(session):
+    orphans = session.info.pop('orphaned_files', None)
+    if orphans:
+        from file_store import remove_objects
+        try:
+            remove_objects(orphans)
+        except OSError:
+            pass  # Left for `flask files gc`
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_orphaned_files(session):
+    session.info.pop('orphaned_files', None)
+
+
+@event.listens_for(Session, 'after_flush')
+def _forget_deleted_documents(session, flush_context):
+    # The segments of a document go with the last translation of it
+    documents = {(obj.user_id, obj.filename) for obj in session.deleted
+                 if isinstance(obj, Translation) and obj.filename}
+    if not documents:
+        return
+
+    connection = session.connection()
+    translations = Translation.__table__
+    segments = FileSegment.__table__
+    for user_id, filename in documents:
+        remaining = connection.execute(
+            db.select(translations.c.id).where(
+                translations.c.user_id == user_id, translations.c.filename == filename
+            ).limit(1)
+        ).first()
+        if remaining is None:
+            connection.execute(segments.delete().where(
+                segments.c.user_id == user_id, segments.c.filename == filename
+            ))
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changed_users(session, flush_context):
+    changed = {obj.id for obj in list(session.dirty) + list(session.deleted) if isinstance(obj, User)}
+    if changed:
+        session.info.setdefault('changed_users', set()).update(changed)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_cached_users(session):
+    changed = session.info.pop('changed_users', None)
+    if changed:
+        from user_cache import user_cache
+        user_cache.invalidate(changed)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_changed_users(session):
+    session.info.pop('changed_users', None)
@@ -0,0 +1,61 @@
+from datetime import datetime
+from app import db
+
+CURSOR_SEPARATOR = '_'
+
+
+def encode_cursor(created_at, row_id):
+    """Opaque position of a row in a (created_at DESC, id DESC) ordering"""
+    return f'{created_at.isoformat()}{CURSOR_SEPARATOR}{row_id}'
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) for a cursor, or None if it is missing or malformed"""
+    if not cursor:
+        return None
+    try:
+        created_at, row_id = cursor.rsplit(CURSOR_SEPARATOR, 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except ValueError:
+        return None
+
+
+class KeysetPage:
+    """One page of a keyset-paginated query (no OFFSET, no COUNT)"""
+
+    def __init__(self, items, per_page, cursor, next_cursor):
+        self.items = items
+        self.per_page = per_page
+        self.cursor = cursor
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return not self.cursor
+
+
+def keyset_paginate(query, created_column, id_column, cursor=None, per_page=10):
+    """Return the rows that come after cursor, newest first.
+
+    The cost is the same for every page as long as an index covers
+    (filter columns, created_column, id_column).
+    """
+    position = decode_cursor(cursor)
+    if position:
+        created_at, row_id = position
+        query = query.filter(db.or_(
+            created_column < created_at,
+            db.and_(created_column == created_at, id_column < row_id)
+        ))
+
+    rows = query.order_by(created_column.desc(), id_column.desc()).limit(per_page + 1).all()
+    items = rows[:per_page]
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor(getattr(last, created_column.key), getattr(last, id_column.key))
+    return KeysetPage(items, per_page, cursor if position else None, next_cursor)
@@ -1,22 +1,35 @@
 import os
-import json
-import csv
-from io import StringIO
+import uuid
 from datetime import datetime
-from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, send_file, make_response, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app, jsonify, stream_with_context, abort, send_from_directory
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.utils import secure_filename
+from werkzeug.datastructures import FileStorage
 from werkzeug.security import check_password_hash
 from app import db
-from models import User, Translation
-from forms import LoginForm, RegisterForm, ProfileForm, VoiceTranslationForm, FileTranslationForm, EditTranslationForm, TextTranslationForm
-from utils import translate_text, detect_language, allowed_file
+from sqlalchemy.orm import joinedload, undefer_group
+from models import User, Translation, FileTranslationJob
+from forms import LoginForm, RegisterForm, ProfileForm, VoiceTranslationForm, FileTranslationForm, EditTranslationForm, TextTranslationForm, target_languages
+from utils import translate_text, translate_text_targets, translate_batch, detect_language, detect_languages, allowed_file, LANGUAGES
+from jobs import submit_file_job, submit_job_group, is_stale, fail_stale_jobs
+from pagination import keyset_paginate
+from exports import iter_history_csv, iter_history_jsonl, gzip_chunks, zip_chunks
+from metrics import stage
+from file_store import store_upload, object_path
+from downloads import send_download
+from avatars import submit_avatar
+from search import search_paginate, history_filters
 
 # Create blueprints
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
 main_bp = Blueprint('main', __name__)
 dashboard_bp = Blueprint('dashboard', __name__, url_prefix='/dashboard')
 
+def wants_json():
+    """True for fetch/XHR clients that asked for a JSON answer"""
+    return request.accept_mimetypes.best == 'application/json' or \
+        request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
 # Authentication routes
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -27,6 +40,10 @@ def login():
     if form.validate_on_submit():
         user = User.query.filter_by(username=form.username.data).first()
         if user and user.check_password(form.password.data):
+            if user.password_needs_rehash():
+                # PASSWORD_HASH_METHOD changed: upgrade while the plain password is at hand
+                user.set_password(form.password.data)
+                db.session.commit()
             login_user(user)
             flash('Connexion réussie!', 'success')
             next_page = request.args.get('next')
@@ -65,6 +82,14 @@ def index():
         return redirect(url_for('dashboard.voice_translation'))
     return redirect(url_for('auth.login'))
 
+@main_bp.route('/avatars/<filename>')
+def avatar(filename):
+    # Names change with the content, so browsers may keep them for a year
+    response = send_from_directory(os.path.abspath(current_app.config['PROFILE_PHOTOS_FOLDER']), filename,
+                                   max_age=current_app.config['AVATAR_MAX_AGE'])
+    response.cache_control.immutable = True
+    return response
+
 # Dashboard routes
 @dashboard_bp.route('/voice_translation', methods=['GET', 'POST'])
 @login_required
@@ -101,129 +126,398 @@ def voice_translation():
     
     return render_template('dashboard/voice_translation.html', form=form)
 
+@dashboard_bp.route('/api/voice/segment', methods=['POST'])
+@login_required
+def voice_segment_api():
+    """Translate one finalized transcript segment as soon as it is recognized"""
+    data = request.get_json(silent=True) or {}
+    text = (data.get('text') or '').strip()
+    target_language = data.get('target_language')
+    source_language = data.get('source_language') or 'auto'
+    
+    if not text:
+        return jsonify(error='Segment vide.'), 400
+    if target_language not in LANGUAGES or target_language == 'auto' or source_language not in LANGUAGES:
+        return jsonify(error='Langue non supportée.'), 400
+    
+    # The client sends back the language detected on earlier segments of the
+    # conversation, so detection only runs until one segment was conclusive
+    source_language = detect_language(text, source_language)
+    translated_text = translate_text(text, target_language, source_language)
+    
+    return jsonify(text=text, translated_text=translated_text,
+                   source_language=source_language, target_language=target_language)
+
+@dashboard_bp.route('/api/voice/finish', methods=['POST'])
+@login_required
+def voice_finish_api():
+    """Persist a streamed conversation as a single voice translation"""
+    data = request.get_json(silent=True) or {}
+    segments = data.get('segments')
+    target_language = data.get('target_language')
+    source_language = data.get('source_language') or 'auto'
+    
+    if not isinstance(segments, list) or not segments or not all(
+            isinstance(segment, dict) and isinstance(segment.get('text'), str)
+            and isinstance(segment.get('translated_text'), str) for segment in segments):
+        return jsonify(error='Aucun segment à enregistrer.'), 400
+    if target_language not in LANGUAGES or source_language not in LANGUAGES:
+        return jsonify(error='Langue non supportée.'), 400
+    
+    translation = Translation(  # type: ignore
+        user_id=current_user.id,
+        original_text=' '.join(segment['text'].strip() for segment in segments),
+        translated_text=' '.join(segment['translated_text'].strip() for segment in segments),
+        source_language=source_language,
+        target_language=target_language,
+        translation_type='voice'
+    )
+    db.session.add(translation)
+    db.session.commit()
+    
+    return jsonify(id=translation.id, edit_url=url_for('dashboard.edit_translation', id=translation.id)), 201
+
 @dashboard_bp.route('/text_translation', methods=['GET', 'POST'])
 @login_required
 def text_translation():
     form = TextTranslationForm()
     if form.validate_on_submit():
         source_text = form.source_text.data.strip() if form.source_text.data else ""
-        target_language = form.target_language.data
+        targets = target_languages(form)
         
         if source_text:
-            # Detect source language
-            source_language = detect_language(source_text)
+            # Detect source language once (skipped when the user picked one)
+            source_language = detect_language(source_text, form.source_language.data)
             
-            # Translate text
-            translated_text = translate_text(source_text, target_language, source_language)
+            # Translate text, into every target language concurrently
+            translated = translate_text_targets(source_text, targets, source_language)
             
-            # Save to database
-            translation = Translation(  # type: ignore
-                user_id=current_user.id,
-                original_text=source_text,
-                translated_text=translated_text,
-                source_language=source_language,
-                target_language=target_language,
-                translation_type='text'
-            )
-            db.session.add(translation)
+            # Save to database, one row per target language
+            translations = [
+                Translation(  # type: ignore
+                    user_id=current_user.id,
+                    original_text=source_text,
+                    translated_text=translated[target_language],
+                    source_language=source_language,
+                    target_language=target_language,
+                    translation_type='text'
+                )
+                for target_language in targets
+            ]
+            db.session.add_all(translations)
             db.session.commit()
             
-            flash('Traduction de texte sauvegardée!', 'success')
+            if len(translations) > 1:
+                flash(f'{len(translations)} traductions de texte sauvegardées!', 'success')
+            else:
+                flash('Traduction de texte sauvegardée!', 'success')
             return render_template('dashboard/text_translation.html', 
                                  form=form, 
-                                 translation=translation)
+                                 translations=translations)
     
     return render_template('dashboard/text_translation.html', form=form)
 
+@dashboard_bp.route('/api/translate_batch', methods=['POST'])
+@login_required
+def translate_batch_api():
+    data = request.get_json(silent=True) or {}
+    texts = data.get('texts')
+    target_language = data.get('target_language')
+    source_language = data.get('source_language', 'auto')
+    
+    if not isinstance(texts, list) or not texts or not all(isinstance(text, str) for text in texts):
+        return jsonify(error='Le champ "texts" doit être une liste de textes non vide.'), 400
+    if len(texts) > current_app.config['BATCH_MAX_TEXTS']:
+        return jsonify(error=f'Au plus {current_app.config["BATCH_MAX_TEXTS"]} textes par requête.'), 400
+    if target_language not in LANGUAGES or target_language == 'auto':
+        return jsonify(error='Langue cible non supportée.'), 400
+    if source_language not in LANGUAGES:
+        return jsonify(error='Langue source non supportée.'), 400
+    
+    texts = [text.strip() for text in texts]
+    unique_texts = list(dict.fromkeys(text for text in texts if text))
+    
+    # Detect once per distinct text, then translate each source language group in batches
+    sources = dict(zip(unique_texts, detect_languages(unique_texts, source_language)))
+    
+    groups = {}
+    for text in unique_texts:
+        groups.setdefault(sources[text], []).append(text)
+    
+    translated = {}
+    try:
+        for group_source, group_texts in groups.items():
+            results = translate_batch(group_texts, target_language, group_source,
+                                      batch_size=current_app.config['TRANSLATION_BATCH_SIZE'])
+            translated.update(zip(group_texts, results))
+    except Exception as e:
+        return jsonify(error=f'Erreur de traduction: {str(e)}'), 502
+    
+    # One row per distinct text, inserted together in a single commit
+    rows = {
+        text: Translation(  # type: ignore
+            user_id=current_user.id,
+            original_text=text,
+            translated_text=translated[text],
+            source_language=sources[text],
+            target_language=target_language,
+            translation_type='text'
+        )
+        for text in unique_texts
+    }
+    db.session.add_all(rows.values())
+    db.session.commit()
+    
+    return jsonify(translations=[
+        {
+            'text': text,
+            'translated_text': translated.get(text, text),
+            'source_language': sources.get(text),
+            'target_language': target_language,
+            'id': rows[text].id if text in rows else None
+        }
+        for text in texts
+    ])
+
 @dashboard_bp.route('/file_translation', methods=['GET', 'POST'])
 @login_required
 def file_translation():
     form = FileTranslationForm()
     if form.validate_on_submit():
         file = form.file.data
-        target_language = form.target_language.data
+        targets = target_languages(form)
         
         if file and allowed_file(file.filename):
             filename = secure_filename(file.filename)
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-            filename = timestamp + filename
-            filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
+            # Stored by content: identical uploads share one file
+            with stage('file_io'):
+                source_file = store_upload(file, os.path.splitext(filename)[1])
             
-            try:
-                # Read file content
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    if filename.endswith('.json'):
-                        content = json.load(f)
-                        original_text = json.dumps(content, ensure_ascii=False, indent=2)
-                    else:
-                        original_text = f.read()
-                
-                # Detect language and translate
-                source_language = detect_language(original_text)
-                translated_text = translate_text(original_text, target_language, source_language)
-                
-                # Create translated file
-                translated_filename = f'translated_{filename}'
-                translated_filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], translated_filename)
-                
-                with open(translated_filepath, 'w', encoding='utf-8') as f:
-                    if filename.endswith('.json'):
-                        # For JSON files, translate values while preserving structure
-                        translated_content = json.loads(translated_text) if translated_text.startswith('{') else {"translated_content": translated_text}
-                        json.dump(translated_content, f, ensure_ascii=False, indent=2)
-                    else:
-                        f.write(translated_text)
-                
-                # Save to database
-                translation = Translation(  # type: ignore
+            # Translate in the background so this worker stays free (or reuse
+            # the result if this file was already translated the same way).
+            # Several target languages make a group: one job each, run together
+            group_id = uuid.uuid4().hex if len(targets) > 1 else None
+            jobs = [
+                FileTranslationJob(  # type: ignore
                     user_id=current_user.id,
-                    original_text=original_text,
-                    translated_text=translated_text,
-                    source_language=source_language,
+                    filename=filename,
+                    source_file=source_file,
+                    source_language=form.source_language.data,
                     target_language=target_language,
-                    translation_type='file',
-                    filename=filename
+                    group_id=group_id
                 )
-                db.session.add(translation)
-                db.session.commit()
-                
-                flash('Fichier traduit avec succès!', 'success')
-                return render_template('dashboard/file_translation.html', 
-                                     form=form, 
-                                     translation=translation,
-                                     download_file=translated_filename)
-                
-            except Exception as e:
-                flash(f'Erreur lors de la traduction du fichier: {str(e)}', 'error')
-                os.remove(filepath)  # Clean up uploaded file
+                for target_language in targets
+            ]
+            db.session.add_all(jobs)
+            db.session.commit()
+            job = jobs[0]
+            
+            if group_id:
+                submit_job_group(jobs)
+                status_url = url_for('dashboard.file_job_group_status', group_id=group_id)
+            else:
+                submit_file_job(job)
+                status_url = url_for('dashboard.file_job_status', job_id=job.id)
+            
+            if wants_json():
+                if group_id:
+                    return jsonify(group_id=group_id, job_ids=[job.id for job in jobs], status_url=status_url), 202
+                return jsonify(job_id=job.id, status_url=status_url), 202
+            return render_template('dashboard/file_translation.html', form=form, job=job, status_url=status_url)
         else:
             flash('Type de fichier non autorisé.', 'error')
     
+    if wants_json() and request.method == 'POST':
+        errors = [error for field_errors in form.errors.values() for error in field_errors]
+        return jsonify(error=errors[0] if errors else 'Type de fichier non autorisé.'), 400
+    
     return render_template('dashboard/file_translation.html', form=form)
 
+@dashboard_bp.route('/jobs/<job_id>')
+@login_required
+def file_job_status(job_id):
+    job = FileTranslationJob.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    if is_stale(job):
+        fail_stale_jobs([job.id])  # Its worker is gone: report it failed rather than pending forever
+    return jsonify(job_payload(job))
+
+def job_payload(job):
+    payload = {
+        'job_id': job.id,
+        'target_language': job.target_language,
+        'status': job.status,
+        'progress': round(job.progress, 1),
+        'error': job.error
+    }
+    if job.status == 'done' and job.translation:
+        translation = job.translation
+        payload.update(
+            download_url=url_for('dashboard.download_translation', id=translation.id),
+            source_language=translation.source_language,
+            target_language=translation.target_language,
+            original_preview=translation.original_preview,
+            translated_preview=translation.translated_preview
+        )
+    return payload
+
+def group_jobs(group_id):
+    """Jobs of a multi-target upload of the current user, by target language, or 404"""
+    jobs = FileTranslationJob.query.options(joinedload(FileTranslationJob.translation)).filter_by(
+        group_id=group_id, user_id=current_user.id
+    ).order_by(FileTranslationJob.target_language).all()
+    if not jobs:
+        abort(404)
+    return jobs
+
+@dashboard_bp.route('/jobs/group/<group_id>')
+@login_required
+def file_job_group_status(group_id):
+    """Status of every job of a multi-target upload, with the zip download once they all ended"""
+    group = group_jobs(group_id)
+    stale = [job.id for job in group if is_stale(job)]
+    if stale:
+        fail_stale_jobs(stale)
+    jobs = [job_payload(job) for job in group]
+    done = [job for job in jobs if 'download_url' in job]
+    if any(job['status'] in FileTranslationJob.ACTIVE_STATUSES for job in jobs):
+        status = 'running' if any(job['status'] != 'pending' for job in jobs) else 'pending'
+    else:
+        status = 'done' if done else 'failed'
+    payload = {
+        'group_id': group_id,
+        'status': status,
+        # Finished jobs count as complete, failed ones included
+        'progress': round(sum(job['progress'] if job['status'] in FileTranslationJob.ACTIVE_STATUSES else 100.0
+                              for job in jobs) / len(jobs), 1),
+        'error': next((job['error'] for job in jobs if job['error']), None),
+        'jobs': jobs
+    }
+    if status == 'done':
+        payload.update(
+            download_url=url_for('dashboard.download_job_group', group_id=group_id),
+            source_language=done[0]['source_language'],
+            target_language=', '.join(job['target_language'] for job in done),
+            original_preview=done[0]['original_preview'],
+            translated_preview=done[0]['translated_preview']
+        )
+    return jsonify(payload)
+
 @dashboard_bp.route('/download/<filename>')
 @login_required
 def download_file(filename):
     filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-    if os.path.exists(filepath):
-        return send_file(filepath, as_attachment=True)
-    flash('Fichier non trouvé.', 'error')
-    return redirect(url_for('dashboard.file_translation'))
+    try:
+        return send_download(filepath, filename)
+    except FileNotFoundError:
+        flash('Fichier non trouvé.', 'error')
+        return redirect(url_for('dashboard.file_translation'))
+
+@dashboard_bp.route('/download/translation/<int:id>')
+@login_required
+def download_translation(id):
+    translation = Translation.query.filter_by(id=id, user_id=current_user.id).first_or_404()
+    etag = None
+    if translation.translated_file:
+        filepath = object_path(translation.translated_file)
+        etag = os.path.splitext(translation.translated_file)[0]  # The content hash
+    elif translation.filename:
+        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], f'translated_{translation.filename}')
+    else:
+        abort(404)
+    try:
+        return send_download(filepath, f'translated_{translation.filename}', etag)
+    except FileNotFoundError:
+        flash('Fichier non trouvé.', 'error')
+        return redirect(url_for('dashboard.file_translation'))
+
+@dashboard_bp.route('/download/group/<group_id>')
+@login_required
+def download_job_group(group_id):
+    """Zip of the translated files of a multi-target upload, streamed as it is built"""
+    jobs = group_jobs(group_id)
+    members = []
+    for job in jobs:
+        if job.status == 'done' and job.translation and job.translation.translated_file:
+            stem, extension = os.path.splitext(job.filename)
+            members.append((f'{stem}_{job.target_language}{extension}', object_path(job.translation.translated_file)))
+    if not members:
+        abort(404)
+    
+    stem = os.path.splitext(jobs[0].filename)[0]
+    response = current_app.response_class(zip_chunks(members), mimetype='application/zip')
+    response.headers["Content-Disposition"] = f"attachment; filename=translated_{stem}.zip"
+    return response
+
+def render_history(translations, keyset, search, filters):
+    languages = {code: name for code, name in LANGUAGES.items() if code != 'auto'}
+    return render_template('dashboard/history.html', translations=translations, keyset=keyset,
+                           search=search, filters=filters, languages=languages)
 
 @dashboard_bp.route('/history')
 @login_required
 def history():
-    page = request.args.get('page', 1, type=int)
-    translations = current_user.translations.order_by(Translation.created_at.desc()).paginate(
-        page=page, per_page=10, error_out=False
+    filters = history_filters(request.args)
+    query = current_user.translations.filter_by(**filters)
+    search_text = request.args.get('q', '').strip()
+    if search_text:
+        # Ranked full-text search, numbered pages
+        translations = search_paginate(query, current_user.id, search_text,
+                                       page=request.args.get('page', 1, type=int), per_page=10)
+        return render_history(translations, keyset=False, search=search_text, filters=filters)
+    
+    if 'page' in request.args:
+        # Numbered pages (OFFSET), kept for existing links
+        page = request.args.get('page', 1, type=int)
+        translations = query.order_by(Translation.created_at.desc()).paginate(
+            page=page, per_page=10, error_out=False
+        )
+        return render_history(translations, keyset=False, search='', filters=filters)
+    
+    translations = keyset_paginate(query, Translation.created_at, Translation.id,
+                                   cursor=request.args.get('cursor'), per_page=10)
+    return render_history(translations, keyset=True, search='', filters=filters)
+
+@dashboard_bp.route('/api/history')
+@login_required
+def history_api():
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    filters = history_filters(request.args)
+    query = current_user.translations.filter_by(**filters)
+    search_text = request.args.get('q', '').strip()
+    if search_text:
+        translations = search_paginate(query, current_user.id, search_text,
+                                       page=request.args.get('page', 1, type=int), per_page=limit)
+        next_cursor = None
+        next_url = url_for('dashboard.history_api', q=search_text, page=translations.next_num, limit=limit,
+                           **filters) if translations.has_next else None
+    else:
+        translations = keyset_paginate(query, Translation.created_at, Translation.id,
+                                       cursor=request.args.get('cursor'), per_page=limit)
+        next_cursor = translations.next_cursor
+        next_url = url_for('dashboard.history_api', cursor=next_cursor, limit=limit, **filters) \
+            if translations.has_next else None
+    return jsonify(
+        items=[{
+            'id': t.id,
+            'created_at': t.created_at.isoformat(),
+            'updated_at': t.updated_at.isoformat() if t.updated_at else None,
+            'translation_type': t.translation_type,
+            'source_language': t.source_language,
+            'target_language': t.target_language,
+            'original_preview': t.original_preview[:100],
+            'translated_preview': t.translated_preview[:100],
+            'filename': t.filename
+        } for t in translations.items],
+        next_cursor=next_cursor,
+        next_url=next_url
     )
-    return render_template('dashboard/history.html', translations=translations)
 
 @dashboard_bp.route('/edit_translation/<int:id>', methods=['GET', 'POST'])
 @login_required
 def edit_translation(id):
-    translation = Translation.query.filter_by(id=id, user_id=current_user.id).first_or_404()
+    translation = Translation.query.options(undefer_group('text')).filter_by(
+        id=id, user_id=current_user.id
+    ).first_or_404()
     form = EditTranslationForm(obj=translation)
     
     if form.validate_on_submit():
@@ -247,28 +541,44 @@ def delete_translation(id):
 @dashboard_bp.route('/export_history')
 @login_required
 def export_history():
-    translations = current_user.translations.order_by(Translation.created_at.desc()).all()
-    
-    output = StringIO()
-    writer = csv.writer(output)
-    writer.writerow(['Date', 'Type', 'Langue source', 'Langue cible', 'Texte original', 'Texte traduit', 'Fichier'])
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'jsonl'):
+        export_format = 'csv'
+    full = request.args.get('full') == '1'
+    compress = request.args.get('gzip') == '1'
     
-    for t in translations:
-        writer.writerow([
-            t.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-            t.translation_type,
-            t.source_language,
-            t.target_language,
-            t.original_text[:100] + '...' if len(t.original_text) > 100 else t.original_text,
-            t.translated_text[:100] + '...' if len(t.translated_text) > 100 else t.translated_text,
-            t.filename or ''
-        ])
+    user_id = current_user.id
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
+
+    def iter_translations():
+        # Queried inside the stream: the view's session is removed once it
+        # returns, and a query bound to it would leak its connection.
+        # Rows are fetched from the server in batches and streamed as they come;
+        # the full texts only when asked for, the previews are enough otherwise.
+        query = Translation.query.filter_by(user_id=user_id)
+        if full:
+            query = query.options(undefer_group('text'))
+        yield from query.order_by(
+            Translation.created_at.desc(), Translation.id.desc()
+        ).yield_per(batch_size)
+
+    translations = iter_translations()
+
+    if export_format == 'jsonl':
+        chunks = iter_history_jsonl(translations, full)
+        mimetype = 'application/x-ndjson'
+    else:
+        chunks = iter_history_csv(translations, full)
+        mimetype = 'text/csv'
     
-    output.seek(0)
-    response = make_response(output.getvalue())
-    response.headers["Content-Disposition"] = f"attachment; filename=historique_traductions_{current_user.username}.csv"
-    response.headers["Content-type"] = "text/csv"
+    filename = f"historique_traductions_{current_user.username}.{export_format}"
+    if compress:
+        chunks = gzip_chunks(chunks)
+        filename += '.gz'
+        mimetype = 'application/gzip'
     
+    response = current_app.response_class(stream_with_context(chunks), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f"attachment; filename={filename}"
     return response
 
 @dashboard_bp.route('/statistics')
@@ -286,8 +596,8 @@ def profile():
     if form.validate_on_submit():
         # Check if username is being changed and if it's already taken
         if form.username.data != current_user.username:
-            existing_user = User.query.filter_by(username=form.username.data).first()
-            if existing_user:
+            taken = db.session.query(User.query.filter_by(username=form.username.data).exists()).scalar()
+            if taken:
                 flash('Ce nom d\'utilisateur est déjà utilisé.', 'error')
                 return render_template('dashboard/profile.html', form=form)
         
@@ -306,25 +616,18 @@ def profile():
             
             current_user.set_password(form.new_password.data)
         
-        # Handle profile photo upload
+        db.session.commit()
+        
+        # Handle profile photo upload: thumbnails are generated in the background,
+        # the photo switches over (and the old one is removed) once they are ready
         if form.profile_photo.data:
             file = form.profile_photo.data
-            if file and allowed_file(file.filename, ['jpg', 'jpeg', 'png', 'gif']):
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_')
-                filename = f"{current_user.id}_{timestamp}{filename}"
-                filepath = os.path.join(current_app.config['PROFILE_PHOTOS_FOLDER'], filename)
-                file.save(filepath)
-                
-                # Remove old profile photo if it's not the default
-                if current_user.profile_photo != 'default_avatar.png':
-                    old_photo_path = os.path.join(current_app.config['PROFILE_PHOTOS_FOLDER'], current_user.profile_photo)
-                    if os.path.exists(old_photo_path):
-                        os.remove(old_photo_path)
-                
-                current_user.profile_photo = filename
+            # Without an upload the field keeps the model's value (the current photo name)
+            if isinstance(file, FileStorage) and allowed_file(file.filename, ['jpg', 'jpeg', 'png', 'gif']):
+                with stage('file_io'):
+                    submit_avatar(file, current_user.id)
+                flash('Votre nouvelle photo apparaîtra dans quelques instants.', 'info')
         
-        db.session.commit()
         flash('Profil mis à jour avec succès!', 'success')
         return redirect(url_for('dashboard.profile'))
     
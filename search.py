@@ -0,0 +1,289 @@
+import re
+import click
+import sqlalchemy as sa
+from flask.cli import AppGroup
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+SEARCH_TABLE = 'translation_search'
+INDEXED_ATTRIBUTES = ('user_id', 'original_text', 'translated_text')
+HISTORY_FILTERS = ('source_language', 'target_language', 'translation_type')
+TRANSLATION_TYPES = {'voice': 'Vocal', 'text': 'Texte', 'file': 'Fichier'}
+MAX_TERMS = 10
+REBUILD_BATCH_SIZE = 1000
+PG_CONFIG = 'simple'  # Histories mix languages: no stemming, one dictionary for all
+
+search_cli = AppGroup('search', help="Index de recherche de l'historique.")
+
+# Search table per engine: 'fts5', 'postgresql', or None when the database cannot hold one.
+# A supported database whose table is missing is not cached: it is looked for again until migrated
+_backends = {}
+
+# The index is a table of its own, filled from Python rather than by triggers or
+# an external-content FTS table, so it only ever sees the texts as the ORM sees them
+# (uncompressed). It keeps no copy of them: the FTS5 table is contentless, and the
+# PostgreSQL one holds the tsvector only.
+_DDL = {
+    'fts5': [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+        "owner, original_text, translated_text, content = '', "
+        "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    ],
+    'postgresql': [
+        f"CREATE TABLE IF NOT EXISTS {SEARCH_TABLE} ("
+        "id INTEGER PRIMARY KEY REFERENCES translation (id) ON DELETE CASCADE, "
+        "user_id INTEGER NOT NULL, document TSVECTOR NOT NULL)",
+        f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_document ON {SEARCH_TABLE} USING gin (document)",
+        f"CREATE INDEX IF NOT EXISTS ix_{SEARCH_TABLE}_user ON {SEARCH_TABLE} (user_id)",
+    ],
+}
+
+_INSERT = {
+    # owner holds 'u<user_id>': matching it in the same MATCH keeps other users' rows out of the scan
+    'fts5': sa.text(f"INSERT INTO {SEARCH_TABLE} (rowid, owner, original_text, translated_text) "
+                    "VALUES (:id, 'u' || :user_id, :original_text, :translated_text)"),
+    'postgresql': sa.text(f"INSERT INTO {SEARCH_TABLE} (id, user_id, document) VALUES (:id, :user_id, "
+                          f"to_tsvector('{PG_CONFIG}', :original_text) || to_tsvector('{PG_CONFIG}', :translated_text))"),
+}
+
+_DELETE = {
+    # A contentless table forgets a row through the 'delete' command, given the values it indexed
+    'fts5': sa.text(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, owner, original_text, translated_text) "
+                    "VALUES ('delete', :id, 'u' || :user_id, :original_text, :translated_text)"),
+    'postgresql': sa.text(f"DELETE FROM {SEARCH_TABLE} WHERE id = :id"),
+}
+
+_CLEAR = {
+    'fts5': f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('delete-all')",
+    'postgresql': f"DELETE FROM {SEARCH_TABLE}",
+}
+
+
+def _supported_backend(connection):
+    """Kind of index this database can hold, or None"""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        return 'postgresql'
+    if dialect == 'sqlite':
+        options = connection.exec_driver_sql('PRAGMA compile_options').scalars().all()
+        if 'ENABLE_FTS5' in options:
+            return 'fts5'
+    return None
+
+
+def search_backend(connection):
+    """Index in use on this connection's database, or None if it has none"""
+    engine = connection.engine
+    if engine not in _backends:
+        backend = _supported_backend(connection)
+        if backend and not sa.inspect(connection).has_table(SEARCH_TABLE):
+            return None  # Not migrated yet: searches fall back to LIKE
+        _backends[engine] = backend
+    return _backends[engine]
+
+
+def create_search_index(connection, fill=True):
+    """Create the search table if this database supports one; fill it when it was just created"""
+    backend = _supported_backend(connection)
+    if backend is None:
+        return False
+    created = not sa.inspect(connection).has_table(SEARCH_TABLE)
+    for statement in _DDL[backend]:
+        connection.exec_driver_sql(statement)
+    _backends[connection.engine] = backend
+    if created and fill:
+        index_translations(connection, clear=False)
+    return created
+
+
+def drop_search_index(connection):
+    connection.exec_driver_sql(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+    _backends.pop(connection.engine, None)
+
+
+def _index_values(translation_id, user_id, original_text, translated_text):
+    return {'id': translation_id, 'user_id': user_id,
+            'original_text': original_text or '', 'translated_text': translated_text or ''}
+
+
+def index_translations(connection, batch_size=REBUILD_BATCH_SIZE, clear=True):
+    """(Re)build the whole index from the translation table; returns the number of rows"""
+    from app import db
+    from models import Translation
+
+    backend = search_backend(connection)
+    if backend is None:
+        return 0
+    if clear:
+        connection.exec_driver_sql(_CLEAR[backend])
+    # Selected through the model's columns, so the texts are read as the ORM sees them
+    rows = connection.execution_options(yield_per=batch_size).execute(
+        db.select(Translation.id, Translation.user_id, Translation.original_text, Translation.translated_text)
+        .order_by(Translation.id)
+    )
+    total = 0
+    for batch in rows.partitions():
+        connection.execute(_INSERT[backend], [_index_values(*row) for row in batch])
+        total += len(batch)
+    return total
+
+
+def _indexed_rows(connection, translation_ids):
+    """Values the index holds for these translations (read from the table), only for those it has"""
+    from app import db
+    from models import Translation
+
+    search = sa.table(SEARCH_TABLE, sa.column('rowid'))
+    rows = connection.execute(
+        db.select(Translation.id, Translation.user_id, Translation.original_text, Translation.translated_text)
+        .join(search, search.c.rowid == Translation.id)
+        .where(Translation.id.in_(translation_ids))
+    )
+    return [_index_values(*row) for row in rows]
+
+
+@event.listens_for(Session, 'before_flush')
+def _collect_search_removals(session, flush_context, instances):
+    """Read what the index holds for the rows this flush deletes or changes, while they are unchanged"""
+    from models import Translation
+
+    removed = {obj.id for obj in session.deleted if isinstance(obj, Translation) and obj.id is not None}
+    for obj in session.dirty:
+        if isinstance(obj, Translation) and obj.id is not None and obj not in session.deleted:
+            state = sa.inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in INDEXED_ATTRIBUTES):
+                removed.add(obj.id)
+    session.info.pop('search_removed', None)
+    if not removed:
+        return
+
+    connection = session.connection()
+    backend = search_backend(connection)
+    if backend == 'fts5':
+        session.info['search_removed'] = _indexed_rows(connection, list(removed))
+    elif backend is not None:
+        session.info['search_removed'] = [{'id': translation_id} for translation_id in removed]
+
+
+@event.listens_for(Session, 'after_flush')
+def _sync_search_index(session, flush_context):
+    from models import Translation
+
+    removed = session.info.pop('search_removed', None)
+    indexed = []
+    for obj in session.new:
+        if isinstance(obj, Translation):
+            indexed.append(obj)
+    for obj in session.dirty:
+        if isinstance(obj, Translation) and obj not in session.deleted:
+            state = sa.inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in INDEXED_ATTRIBUTES):
+                indexed.append(obj)
+    if not removed and not indexed:
+        return
+
+    connection = session.connection()
+    backend = search_backend(connection)
+    if backend is None:
+        return
+    if removed:
+        connection.execute(_DELETE[backend], removed)
+    if indexed:
+        connection.execute(_INSERT[backend], [
+            _index_values(obj.id, obj.user_id, obj.original_text, obj.translated_text) for obj in indexed
+        ])
+
+
+class SearchPage:
+    """One page of ranked search results (OFFSET paging, next page detected without a COUNT)"""
+
+    def __init__(self, items, page, per_page, has_next):
+        self.items = items
+        self.page = page
+        self.per_page = per_page
+        self.has_next = has_next
+
+    @property
+    def has_prev(self):
+        return self.page > 1
+
+    @property
+    def prev_num(self):
+        return self.page - 1 if self.has_prev else None
+
+    @property
+    def next_num(self):
+        return self.page + 1 if self.has_next else None
+
+
+def search_terms(text):
+    """Words of a user query, without any search operator syntax"""
+    return re.findall(r'\w+', (text or '').lower())[:MAX_TERMS]
+
+
+def history_filters(args):
+    """Filters of the history pages present in args (request.args), by column name"""
+    return {name: args[name] for name in HISTORY_FILTERS if args.get(name)}
+
+
+def search_paginate(query, user_id, text, page=1, per_page=10):
+    """Rank the translations of query (already limited to user_id) matching every word of text.
+
+    The last word also matches as a prefix, for search-as-you-type. Without
+    a search index the words are looked up with LIKE, newest first.
+    """
+    from app import db
+    from models import Translation
+
+    terms = search_terms(text)
+    page = max(page, 1)
+    if not terms:
+        return SearchPage([], page, per_page, False)
+
+    backend = search_backend(db.session.connection())
+    if backend == 'fts5':
+        search = sa.table(SEARCH_TABLE, sa.column('rowid'))
+        phrases = ' '.join(f'"{term}"' for term in terms) + '*'
+        match = f'owner : "u{user_id}" AND {{original_text translated_text}} : ({phrases})'
+        query = query.join(search, search.c.rowid == Translation.id).filter(
+            sa.literal_column(SEARCH_TABLE).op('MATCH')(match)
+        ).order_by(sa.func.bm25(sa.literal_column(SEARCH_TABLE), 0.0, 1.0, 1.0), Translation.id.desc())
+    elif backend == 'postgresql':
+        search = sa.table(SEARCH_TABLE, sa.column('id'), sa.column('user_id'), sa.column('document'))
+        tsquery = sa.func.to_tsquery(PG_CONFIG, ' & '.join(terms[:-1] + [terms[-1] + ':*']))
+        query = query.join(search, search.c.id == Translation.id).filter(
+            search.c.user_id == user_id, search.c.document.op('@@')(tsquery)
+        ).order_by(sa.func.ts_rank(search.c.document, tsquery).desc(), Translation.id.desc())
+    else:
+        # Compressed texts cannot be matched in SQL: only those stored as is are found
+        original_text = sa.type_coerce(Translation.original_text, sa.Text)
+        translated_text = sa.type_coerce(Translation.translated_text, sa.Text)
+        for term in terms:
+            query = query.filter(db.or_(
+                sa.func.lower(original_text).contains(term, autoescape=True),
+                sa.func.lower(translated_text).contains(term, autoescape=True)
+            ))
+        query = query.order_by(Translation.created_at.desc(), Translation.id.desc())
+
+    rows = query.offset((page - 1) * per_page).limit(per_page + 1).all()
+    return SearchPage(rows[:per_page], page, per_page, len(rows) > per_page)
+
+
+@search_cli.command('rebuild')
+def rebuild_command():
+    """Reconstruit l'index de recherche à partir des traductions."""
+    from app import db
+
+    with db.engine.begin() as connection:
+        create_search_index(connection, fill=False)
+        total = index_translations(connection)
+        backend = search_backend(connection)
+    if backend is None:
+        click.echo("Cette base de données ne permet pas d'index de recherche : la recherche utilise LIKE.")
+    else:
+        click.echo(f'{total} traduction(s) indexée(s).')
+
+
+def init_search(app):
+    app.cli.add_command(search_cli)
+    app.add_template_global(TRANSLATION_TYPES, 'translation_types')
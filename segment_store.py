@@ -0,0 +1,91 @@
+import hashlib
+import logging
+import threading
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+DELETE_BATCH_SIZE = 500
+
+
+def segment_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class SegmentStore:
+    """Segment translations of one document (user, filename, language pair) between uploads.
+
+    Loaded once before translating; lookups and additions are thread-safe so
+    the chunk workers can share it. save() then keeps exactly the segments of
+    the version just translated, in the caller's transaction.
+    """
+
+    def __init__(self, user_id, filename, source_language, target_language):
+        from app import db
+        from models import FileSegment
+
+        self.user_id = user_id
+        self.filename = filename
+        self.source_language = source_language
+        self.target_language = target_language
+        self._lock = threading.Lock()
+        self._known = {}
+        self._used = set()
+        self._added = {}
+        self.counters = {'reused': 0, 'translated': 0}
+
+        rows = db.session.execute(
+            db.select(FileSegment.id, FileSegment.segment_hash, FileSegment.translated_text).where(
+                FileSegment.user_id == user_id, FileSegment.filename == filename,
+                FileSegment.source_language == source_language, FileSegment.target_language == target_language
+            )
+        )
+        for row_id, key, translated_text in rows:
+            self._known[key] = (row_id, translated_text)
+
+    def get(self, text):
+        """Translation kept for this segment text, or None"""
+        key = segment_hash(text)
+        with self._lock:
+            known = self._known.get(key)
+            if known is not None:
+                self._used.add(key)
+                self.counters['reused'] += 1
+                return known[1]
+            added = self._added.get(key)
+            if added is not None:
+                self.counters['reused'] += 1  # Repeated within the document
+            return added
+
+    def add(self, text, translated_text):
+        with self._lock:
+            self._added[segment_hash(text)] = translated_text
+            self.counters['translated'] += 1
+
+    def save(self):
+        """Store the new segments and drop those the document no longer has (no commit)"""
+        from app import db
+        from models import FileSegment
+
+        with self._lock:
+            stale = [row_id for key, (row_id, _) in self._known.items() if key not in self._used]
+            added = {key: text for key, text in self._added.items() if key not in self._known}
+
+        for start in range(0, len(stale), DELETE_BATCH_SIZE):
+            FileSegment.query.filter(FileSegment.id.in_(stale[start:start + DELETE_BATCH_SIZE])) \
+                .delete(synchronize_session=False)
+        if not added:
+            return
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(FileSegment), [{
+                    'user_id': self.user_id,
+                    'filename': self.filename,
+                    'source_language': self.source_language,
+                    'target_language': self.target_language,
+                    'segment_hash': key,
+                    'translated_text': translated_text,
+                } for key, translated_text in added.items()])
+        except IntegrityError:
+            # Another job stored this document concurrently: its segments serve as well
+            logger.info('Segments of %s were saved concurrently', self.filename)
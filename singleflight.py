@@ -0,0 +1,132 @@
+import os
+import time
+import uuid
+import threading
+
+DEFAULT_WAIT_TIMEOUT = 15.0  # Seconds a process waits for another one's result before calling itself
+POLL_INTERVAL = 0.05
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first caller (the leader) does the work; callers arriving while it
+    is in flight wait for it and receive the same result or exception.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.counters = {'leaders': 0, 'coalesced': 0}
+
+    def claim(self, key):
+        """Return (call, leader); a leader must later resolve() the call"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.counters['coalesced'] += 1
+                return call, False
+            call = self._calls[key] = _Call()
+            self.counters['leaders'] += 1
+            return call, True
+
+    def resolve(self, key, call, result=None, error=None):
+        call.result = result
+        call.error = error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+    @staticmethod
+    def wait(call):
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key, function):
+        call, leader = self.claim(key)
+        if not leader:
+            return self.wait(call)
+
+        try:
+            result = function()
+        except Exception as e:
+            self.resolve(key, call, error=e)
+            raise
+        self.resolve(key, call, result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, in_flight=len(self._calls))
+
+
+def _try_claim(path, token, stale_after):
+    """Create the claim file of a key; a claim older than stale_after (its leader died) is replaced"""
+    try:
+        fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+    except FileExistsError:
+        try:
+            if time.time() - os.path.getmtime(path) > stale_after:
+                os.unlink(path)
+        except OSError:
+            pass  # Released or replaced meanwhile
+        return False
+    with os.fdopen(fd, 'w') as claim_file:
+        claim_file.write(token)
+    return True
+
+
+def _release_claim(path, token):
+    try:
+        with open(path) as claim_file:
+            if claim_file.read() != token:
+                return  # Ours was taken over as stale
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def process_flight(lock_dir, key, lookup, function, wait_timeout=DEFAULT_WAIT_TIMEOUT):
+    """Run function once per key across the processes of this host.
+
+    The leader claims key by creating a file in lock_dir, then calls
+    function with no lock held. The other processes poll lookup() (a store
+    shared with the leader) until it has the result, the claim goes away or
+    wait_timeout runs out, then call function themselves.
+    key is a hex digest.
+    """
+    if not lock_dir:
+        return function()
+
+    os.makedirs(lock_dir, exist_ok=True)
+    path = os.path.join(lock_dir, f'{key}.claim')
+    token = f'{os.getpid()}:{uuid.uuid4().hex}'
+    deadline = time.monotonic() + wait_timeout
+    while True:
+        if _try_claim(path, token, wait_timeout):
+            try:
+                # Another process may have stored it while we waited for the claim
+                result = lookup()
+                return result if result is not None else function()
+            finally:
+                _release_claim(path, token)
+
+        result = lookup()
+        if result is not None:
+            return result
+        if time.monotonic() >= deadline:
+            return function()
+        time.sleep(POLL_INTERVAL)
+
+
+translation_flights = SingleFlight()
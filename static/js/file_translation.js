@@ -6,8 +6,16 @@ class FileTranslation {
         this.fileName = document.getElementById('fileName');
         this.fileSize = document.getElementById('fileSize');
         this.translateBtn = document.getElementById('translateFileBtn');
+        this.form = document.getElementById('fileTranslationForm');
+        this.jobProgress = document.getElementById('jobProgress');
+        this.pollInterval = 1000;
         
         this.bindEvents();
+        
+        // Page rendered after a classic form post: resume polling the job
+        if (this.jobProgress && this.jobProgress.dataset.statusUrl) {
+            this.pollJob(this.jobProgress.dataset.statusUrl);
+        }
     }
     
     bindEvents() {
@@ -34,6 +42,13 @@ class FileTranslation {
             this.uploadArea.classList.remove('dragover');
         });
         
+        if (this.form) {
+            this.form.addEventListener('submit', (e) => {
+                e.preventDefault();
+                this.submitJob();
+            });
+        }
+        
         this.uploadArea.addEventListener('drop', (e) => {
             e.preventDefault();
             this.uploadArea.classList.remove('dragover');
@@ -71,6 +86,116 @@ class FileTranslation {
         this.translateBtn.disabled = false;
     }
     
+    async submitJob() {
+        this.translateBtn.disabled = true;
+        this.showJobProgress();
+        
+        try {
+            const response = await fetch(this.form.action || window.location.href, {
+                method: 'POST',
+                body: new FormData(this.form),
+                headers: { 'Accept': 'application/json' }
+            });
+            const data = await response.json();
+            
+            if (!response.ok) {
+                this.jobFailed(data.error);
+                return;
+            }
+            this.pollJob(data.status_url);
+        } catch (error) {
+            console.error('File upload error:', error);
+            this.jobFailed('Erreur lors de l\'envoi du fichier.');
+        }
+    }
+    
+    async pollJob(statusUrl) {
+        try {
+            const response = await fetch(statusUrl, { headers: { 'Accept': 'application/json' } });
+            const job = await response.json();
+            
+            this.updateJobProgress(job);
+            
+            if (job.status === 'done') {
+                this.jobDone(job);
+            } else if (job.status === 'failed') {
+                this.jobFailed(job.error);
+            } else {
+                setTimeout(() => this.pollJob(statusUrl), this.pollInterval);
+            }
+        } catch (error) {
+            console.error('Job polling error:', error);
+            setTimeout(() => this.pollJob(statusUrl), this.pollInterval * 3);
+        }
+    }
+    
+    showJobProgress() {
+        if (!this.jobProgress) return;
+        
+        this.jobProgress.style.display = '';
+        document.getElementById('jobResult').style.display = 'none';
+        document.getElementById('jobProgressBarContainer').style.display = '';
+        document.getElementById('jobTitle').innerHTML = '<i class="fas fa-spinner fa-spin text-primary"></i> Traduction en cours...';
+        this.updateJobProgress({ status: 'pending', progress: 0 });
+    }
+    
+    updateJobProgress(job) {
+        const statusText = {
+            pending: 'Le fichier est dans la file d\'attente.',
+            running: `Traduction en cours... ${Math.round(job.progress)}%`,
+            done: 'Traduction terminée.',
+            failed: 'La traduction a échoué.'
+        };
+        
+        document.getElementById('jobProgressBar').style.width = `${job.progress}%`;
+        document.getElementById('jobStatusText').textContent = statusText[job.status] || '';
+    }
+    
+    jobDone(job) {
+        document.getElementById('jobTitle').innerHTML = '<i class="fas fa-check-circle text-success"></i> Traduction terminée';
+        document.getElementById('jobProgressBarContainer').style.display = 'none';
+        document.getElementById('jobSourceLanguage').textContent = job.source_language.toUpperCase();
+        document.getElementById('jobTargetLanguage').textContent = job.target_language.toUpperCase();
+        document.getElementById('jobOriginalPreview').textContent = job.original_preview;
+        document.getElementById('jobTranslatedPreview').textContent = job.translated_preview;
+        document.getElementById('jobDownloadLink').href = job.download_url;
+        this.showTargets(job.jobs);
+        document.getElementById('jobResult').style.display = 'block';
+        this.translateBtn.disabled = false;
+    }
+    
+    showTargets(jobs) {
+        // Multi-target upload: the main link is the zip, each language is also listed on its own
+        const list = document.getElementById('jobTargets');
+        const label = document.getElementById('jobDownloadLabel');
+        list.innerHTML = '';
+        list.style.display = jobs ? '' : 'none';
+        label.textContent = jobs ? 'Télécharger toutes les traductions (.zip)' : 'Télécharger le fichier traduit';
+        if (!jobs) return;
+        
+        jobs.forEach((job) => {
+            const item = document.createElement('li');
+            if (job.download_url) {
+                const link = document.createElement('a');
+                link.href = job.download_url;
+                link.textContent = job.target_language.toUpperCase();
+                item.appendChild(link);
+            } else {
+                item.className = 'text-danger';
+                item.textContent = `${job.target_language.toUpperCase()} : échec (${job.error || 'erreur inconnue'})`;
+            }
+            list.appendChild(item);
+        });
+    }
+    
+    jobFailed(message) {
+        if (this.jobProgress) {
+            this.jobProgress.style.display = 'none';
+        }
+        this.showError('Erreur lors de la traduction du fichier: ' + (message || 'erreur inconnue'));
+        this.translateBtn.disabled = false;
+    }
+    
     displayFileInfo(file) {
         if (!this.fileInfo || !this.fileName || !this.fileSize) return;
         
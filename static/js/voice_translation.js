@@ -10,6 +10,17 @@ class VoiceTranslation {
         this.transcribedDiv = document.getElementById('transcribedText');
         this.translateBtn = document.getElementById('translateBtn');
         this.hiddenInput = document.querySelector('input[name="transcribed_text"]');
+        this.targetSelect = document.querySelector('select[name="target_language"]');
+        this.liveContainer = document.getElementById('liveTranslationContainer');
+        this.liveDiv = document.getElementById('liveTranslation');
+        
+        // Streaming mode: each finalized segment is translated on its own
+        const app = document.getElementById('voiceApp');
+        this.segmentUrl = app ? app.dataset.segmentUrl : null;
+        this.finishUrl = app ? app.dataset.finishUrl : null;
+        this.segments = [];
+        this.pendingSegments = [];
+        this.sourceLanguage = 'auto';
         
         this.initSpeechRecognition();
         this.bindEvents();
@@ -34,23 +45,26 @@ class VoiceTranslation {
         };
         
         this.recognition.onresult = (event) => {
-            let finalTranscript = '';
             let interimTranscript = '';
             
             for (let i = event.resultIndex; i < event.results.length; i++) {
                 const transcript = event.results[i][0].transcript;
                 if (event.results[i].isFinal) {
-                    finalTranscript += transcript;
+                    this.transcribedText += transcript + ' ';
+                    this.translateSegment(transcript);
                 } else {
                     interimTranscript += transcript;
                 }
             }
             
-            this.transcribedText = finalTranscript;
-            this.transcribedDiv.innerHTML = finalTranscript + '<span class="text-muted">' + interimTranscript + '</span>';
-            this.hiddenInput.value = finalTranscript;
+            this.transcribedDiv.textContent = this.transcribedText;
+            const interim = document.createElement('span');
+            interim.className = 'text-muted';
+            interim.textContent = interimTranscript;
+            this.transcribedDiv.appendChild(interim);
+            this.hiddenInput.value = this.transcribedText.trim();
             
-            if (finalTranscript.trim()) {
+            if (this.transcribedText.trim()) {
                 this.translateBtn.disabled = false;
             }
         };
@@ -64,6 +78,7 @@ class VoiceTranslation {
         this.recognition.onend = () => {
             this.isRecording = false;
             this.updateUI();
+            this.finishConversation();
         };
     }
     
@@ -88,6 +103,12 @@ class VoiceTranslation {
             this.transcribedDiv.textContent = '';
             this.hiddenInput.value = '';
             this.translateBtn.disabled = true;
+            this.segments = [];
+            this.pendingSegments = [];
+            this.sourceLanguage = 'auto';
+            if (this.liveDiv) {
+                this.liveDiv.textContent = '';
+            }
             
             this.recognition.start();
         } catch (error) {
@@ -95,6 +116,78 @@ class VoiceTranslation {
         }
     }
     
+    translateSegment(text) {
+        if (!this.segmentUrl || !text.trim()) return;
+        
+        // Keep the slot so translations stay in speaking order even if answers arrive out of order
+        const segment = { text: text.trim(), translated_text: null };
+        this.segments.push(segment);
+        
+        const request = fetch(this.segmentUrl, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json', 'Accept': 'application/json' },
+            body: JSON.stringify({
+                text: segment.text,
+                target_language: this.targetSelect.value,
+                source_language: this.sourceLanguage
+            })
+        })
+            .then(response => response.ok ? response.json() : Promise.reject(response.status))
+            .then(data => {
+                segment.translated_text = data.translated_text;
+                if (data.source_language && data.source_language !== 'auto') {
+                    this.sourceLanguage = data.source_language;
+                }
+                this.renderLiveTranslation();
+            })
+            .catch(error => {
+                console.error('Segment translation error:', error);
+                segment.translated_text = '';
+            });
+        this.pendingSegments.push(request);
+    }
+    
+    renderLiveTranslation() {
+        if (!this.liveDiv) return;
+        
+        this.liveContainer.style.display = 'block';
+        this.liveDiv.textContent = this.segments
+            .filter(segment => segment.translated_text)
+            .map(segment => segment.translated_text)
+            .join(' ');
+    }
+    
+    async finishConversation() {
+        if (!this.finishUrl || this.segments.length === 0) return;
+        
+        await Promise.all(this.pendingSegments);
+        const segments = this.segments.filter(segment => segment.translated_text);
+        if (segments.length === 0) return;
+        
+        try {
+            const response = await fetch(this.finishUrl, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json', 'Accept': 'application/json' },
+                body: JSON.stringify({
+                    segments: segments,
+                    source_language: this.sourceLanguage,
+                    target_language: this.targetSelect.value
+                })
+            });
+            if (!response.ok) throw new Error(response.status);
+            
+            // Already saved: the full-page form would store it a second time
+            this.segments = [];
+            this.translateBtn.disabled = true;
+            this.statusDiv.style.display = 'block';
+            this.statusDiv.className = 'alert alert-success';
+            this.statusDiv.innerHTML = '<i class="fas fa-check-circle"></i> Conversation traduite et sauvegardée!';
+        } catch (error) {
+            console.error('Conversation save error:', error);
+            this.showError('Impossible de sauvegarder la conversation. Utilisez le bouton "Traduire".');
+        }
+    }
+    
     stopRecording() {
         if (this.recognition && this.isRecording) {
             this.recognition.stop();
@@ -114,7 +207,7 @@ class VoiceTranslation {
             this.statusDiv.style.display = 'none';
             
             if (this.transcribedText.trim()) {
-                this.transcribedDiv.innerHTML = this.transcribedText;
+                this.transcribedDiv.textContent = this.transcribedText;
             } else {
                 this.transcribedDiv.textContent = 'Cliquez sur "Commencer l\'enregistrement" pour parler...';
             }
@@ -0,0 +1,94 @@
+import base64
+import zlib
+import sqlalchemy as sa
+from flask import current_app, has_app_context
+from sqlalchemy.types import TypeDecorator
+
+# Control characters: typed or pasted text does not start with it, and a text
+# that does is stored compressed anyway, so reading a value is never ambiguous
+MARKER = '\x1fzlib\x1f'
+LEVEL = 6
+DEFAULT_MIN_SIZE = 2048  # Bytes; smaller texts gain little once base64 and the marker are added
+BATCH_SIZE = 200  # Rows rewritten per round-trip by compress_translations
+
+
+def compression_min_size():
+    if has_app_context():
+        return current_app.config.get('TEXT_COMPRESSION_MIN_SIZE', DEFAULT_MIN_SIZE)
+    return DEFAULT_MIN_SIZE
+
+
+def compress_text(value, min_size=None):
+    """Stored form of a text: compressed if it is large enough for that to pay off, as is otherwise"""
+    if value is None:
+        return None
+    if min_size is None:
+        min_size = compression_min_size()
+    marked = value.startswith(MARKER)
+    data = value.encode('utf-8')
+    if not marked and (min_size <= 0 or len(data) < min_size):
+        return value
+    packed = MARKER + base64.b64encode(zlib.compress(data, LEVEL)).decode('ascii')
+    if marked or len(packed) < len(data):
+        return packed
+    return value
+
+
+def decompress_text(value):
+    if value is None or not value.startswith(MARKER):
+        return value
+    return zlib.decompress(base64.b64decode(value[len(MARKER):])).decode('utf-8')
+
+
+class CompressedText(TypeDecorator):
+    """Text column holding large values zlib-compressed (base64 behind MARKER).
+
+    Still a text column, so small values stay readable in SQL; only the ORM
+    and queries selecting the column see the texts uncompressed.
+    """
+
+    impl = sa.Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        return decompress_text(value)
+
+
+def _rewrite_texts(connection, convert, batch_size):
+    """Apply convert to the stored texts of every translation; returns the number of rows changed"""
+    translation = sa.table('translation', sa.column('id'), sa.column('original_text'), sa.column('translated_text'))
+    update = translation.update().where(translation.c.id == sa.bindparam('row_id')).values(
+        original_text=sa.bindparam('original'), translated_text=sa.bindparam('translated')
+    )
+    changed = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(translation.c.id, translation.c.original_text, translation.c.translated_text)
+            .where(translation.c.id > last_id).order_by(translation.c.id).limit(batch_size)
+        ).all()
+        if not rows:
+            return changed
+        last_id = rows[-1].id
+        updates = []
+        for row_id, original_text, translated_text in rows:
+            original, translated = convert(original_text), convert(translated_text)
+            if original != original_text or translated != translated_text:
+                updates.append({'row_id': row_id, 'original': original, 'translated': translated})
+        if updates:
+            connection.execute(update, updates)
+            changed += len(updates)
+
+
+def compress_translations(connection, batch_size=BATCH_SIZE):
+    """Compress the stored texts of existing translations that are over the threshold"""
+    min_size = compression_min_size()
+    return _rewrite_texts(connection, lambda value: compress_text(decompress_text(value), min_size), batch_size)
+
+
+def decompress_translations(connection, batch_size=BATCH_SIZE):
+    """Store every translation text uncompressed again"""
+    return _rewrite_texts(connection, decompress_text, batch_size)
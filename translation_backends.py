@@ -0,0 +1,232 @@
+import os
+import re
+import json
+import time
+import importlib
+import threading
+from flask import current_app, has_app_context
+
+DEFAULT_BACKEND = 'google'
+DEFAULT_TIMEOUT = 10.0  # Seconds
+BATCH_MAX_CHARS = 4500  # Per request of a joined batch; the Google web endpoint refuses more than 5000
+
+_registry = {}
+_instances = {}
+_lock = threading.Lock()
+# Slow-to-import client libraries of the built-in backends, see preload_backend
+_CLIENT_MODULES = {'google': 'googletrans', 'google_async': 'translation_client'}
+
+
+class TranslationBackend:
+    """Base class for translation engines.
+
+    Subclasses implement translate(); translate_batch() and detect() have
+    generic fallbacks (one call per text, and no detection respectively).
+    """
+
+    name = None
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, **options):
+        self.timeout = timeout
+        self.options = options
+
+    def translate(self, text, source_language, target_language):
+        raise NotImplementedError
+
+    def translate_batch(self, texts, source_language, target_language):
+        return [self.translate(text, source_language, target_language) for text in texts]
+
+    def detect(self, text):
+        """Return a language code, or None to let langdetect decide"""
+        return None
+
+
+class GoogleTransBackend(TranslationBackend):
+    """googletrans (unofficial Google Translate web endpoint)"""
+
+    name = 'google'
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, **options):
+        super().__init__(timeout, **options)
+        from googletrans import Translator
+        self.translator = Translator(timeout=timeout)
+
+    def translate(self, text, source_language, target_language):
+        return self.translator.translate(text, src=source_language, dest=target_language).text
+
+    def translate_batch(self, texts, source_language, target_language):
+        """Send single-line texts joined by line breaks, as few requests as BATCH_MAX_CHARS allows.
+
+        googletrans translates a list with one request per item. Google keeps
+        line breaks, so an answer splits back into one line per text; a group
+        whose answer does not is translated text by text. Texts of several
+        lines are always sent alone.
+        """
+        results = list(texts)
+        groups = []
+        size = BATCH_MAX_CHARS
+        for i, text in enumerate(texts):
+            if not text.strip():
+                continue  # Nothing to translate
+            if '\n' in text or len(text) >= BATCH_MAX_CHARS:
+                groups.append([i])
+                size = BATCH_MAX_CHARS  # The next text starts a group of its own
+                continue
+            if size + len(text) + 1 > BATCH_MAX_CHARS:
+                groups.append([])
+                size = 0
+            groups[-1].append(i)
+            size += len(text) + 1
+        for group in groups:
+            if len(group) == 1:
+                results[group[0]] = self.translate(texts[group[0]], source_language, target_language)
+                continue
+            lines = self.translate('\n'.join(texts[i] for i in group), source_language, target_language).split('\n')
+            if len(lines) != len(group):
+                lines = [self.translate(texts[i], source_language, target_language) for i in group]
+            for i, line in zip(group, lines):
+                results[i] = line
+        return results
+
+
+class LocalBackend(TranslationBackend):
+    """Deterministic offline engine based on a phrase table.
+
+    Known phrases are translated from the table, then known words one by
+    one; anything else is returned tagged with the target language. An
+    optional fixed latency simulates network time in benchmarks.
+    """
+
+    name = 'local'
+
+    BUILTIN_PHRASES = {
+        'fr': {
+            'en': {'bonjour': 'hello', 'bonsoir': 'good evening', 'merci': 'thank you', 'au revoir': 'goodbye',
+                   'oui': 'yes', 'non': 'no', 'le monde': 'the world', 'comment allez-vous ?': 'how are you?'},
+            'es': {'bonjour': 'hola', 'merci': 'gracias', 'au revoir': 'adiós', 'oui': 'sí', 'non': 'no'},
+        },
+        'en': {
+            'fr': {'hello': 'bonjour', 'good evening': 'bonsoir', 'thank you': 'merci', 'goodbye': 'au revoir',
+                   'yes': 'oui', 'no': 'non', 'the world': 'le monde', 'how are you?': 'comment allez-vous ?'},
+            'es': {'hello': 'hola', 'thank you': 'gracias', 'goodbye': 'adiós', 'yes': 'sí', 'no': 'no'},
+        },
+    }
+
+    STOPWORDS = {
+        'fr': {'le', 'la', 'les', 'et', 'est', 'un', 'une', 'des', 'je', 'vous', 'bonjour', 'merci'},
+        'en': {'the', 'and', 'is', 'a', 'an', 'of', 'to', 'you', 'hello', 'thank'},
+        'es': {'el', 'la', 'los', 'y', 'es', 'un', 'una', 'de', 'hola', 'gracias'},
+        'de': {'der', 'die', 'das', 'und', 'ist', 'ein', 'eine', 'ich', 'hallo', 'danke'},
+    }
+
+    WORD = re.compile(r'\w+|\W+')
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, latency=0.0, phrase_table=None, **options):
+        super().__init__(timeout, **options)
+        self.latency = latency
+        self.phrases = json.loads(json.dumps(self.BUILTIN_PHRASES))
+        if phrase_table and os.path.exists(phrase_table):
+            with open(phrase_table, 'r', encoding='utf-8') as f:
+                for source, targets in json.load(f).items():
+                    for target, phrases in targets.items():
+                        table = self.phrases.setdefault(source, {}).setdefault(target, {})
+                        table.update({key.lower(): value for key, value in phrases.items()})
+
+    def _wait(self):
+        if self.latency:
+            if self.timeout and self.latency > self.timeout:
+                time.sleep(self.timeout)
+                raise TimeoutError(f'local backend exceeded {self.timeout}s')
+            time.sleep(self.latency)
+
+    def translate(self, text, source_language, target_language):
+        self._wait()
+        return self._translate(text, source_language, target_language)
+
+    def translate_batch(self, texts, source_language, target_language):
+        # One simulated round-trip for the whole batch
+        self._wait()
+        return [self._translate(text, source_language, target_language) for text in texts]
+
+    def _translate(self, text, source_language, target_language):
+        if source_language == 'auto':
+            source_language = self.detect(text) or 'auto'
+        table = self.phrases.get(source_language, {}).get(target_language, {})
+
+        phrase = table.get(' '.join(text.split()).lower())
+        if phrase is not None:
+            return phrase
+
+        words = self.WORD.findall(text)
+        if table and any(word.lower() in table for word in words):
+            return ''.join(table.get(word.lower(), word) for word in words)
+        return f'[{target_language}] {text}'
+
+    def detect(self, text):
+        words = [word.lower() for word in self.WORD.findall(text[:2000]) if word.strip()]
+        scores = {language: sum(word in stopwords for word in words)
+                  for language, stopwords in self.STOPWORDS.items()}
+        language, score = max(sorted(scores.items()), key=lambda item: item[1])
+        return language if score else None
+
+
+def register_backend(name, factory):
+    """Register a backend class (or factory) under a name usable in TRANSLATION_BACKEND"""
+    with _lock:
+        _registry[name] = factory
+        _instances.pop(name, None)
+
+
+def available_backends():
+    return sorted(_registry)
+
+
+def _backend_options(name):
+    if not has_app_context():
+        return {'timeout': DEFAULT_TIMEOUT}
+    config = current_app.config
+    options = dict(config.get('TRANSLATION_BACKEND_OPTIONS', {}).get(name, {}))
+    options.setdefault('timeout', config.get('TRANSLATION_BACKEND_TIMEOUTS', {}).get(name, DEFAULT_TIMEOUT))
+    return options
+
+
+def get_backend(name=None):
+    """Return the (shared) instance of the configured translation backend"""
+    if name is None:
+        name = current_app.config.get('TRANSLATION_BACKEND', DEFAULT_BACKEND) if has_app_context() else DEFAULT_BACKEND
+
+    with _lock:
+        backend = _instances.get(name)
+        if backend is None:
+            if name not in _registry:
+                raise ValueError(f'Moteur de traduction inconnu: {name}')
+            backend = _instances[name] = _registry[name](**_backend_options(name))
+        return backend
+
+
+def preload_backend(name):
+    """Import the client library of a backend ahead of its first use, e.g. before forking workers.
+
+    Instances are still created by each process: their connection pools
+    must not be shared across a fork.
+    """
+    module = _CLIENT_MODULES.get(name)
+    if module:
+        importlib.import_module(module)
+
+
+def reset_backends():
+    """Forget the shared instances, e.g. after changing the configuration"""
+    with _lock:
+        _instances.clear()
+
+
+def _async_google_backend(**options):
+    # Imported lazily: only deployments that select it need the asyncio client
+    from translation_client import AsyncGoogleBackend
+    return AsyncGoogleBackend(**options)
+
+
+register_backend(GoogleTransBackend.name, GoogleTransBackend)
+register_backend(LocalBackend.name, LocalBackend)
+register_backend('google_async', _async_google_backend)
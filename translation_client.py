@@ -0,0 +1,245 @@
+import os
+import math
+import time
+import random
+import asyncio
+import logging
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from urllib.parse import urlsplit
+import httpx
+from translation_backends import TranslationBackend
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_TRANSLATE_URL = 'https://translate.googleapis.com/translate_a/single'
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Connection problems and timeouts, the failures worth retrying. httpx before 0.18 (pinned by
+# googletrans) has no TransportError and re-exports httpcore's exceptions, which are not HTTPErrors
+if hasattr(httpx, 'TransportError'):
+    TRANSPORT_ERRORS = (httpx.TransportError, asyncio.TimeoutError)
+else:
+    TRANSPORT_ERRORS = (httpx.NetworkError, httpx.ProtocolError, httpx.ProxyError, httpx.ConnectTimeout,
+                        httpx.ReadTimeout, httpx.WriteTimeout, httpx.PoolTimeout, asyncio.TimeoutError)
+
+
+class CircuitOpenError(Exception):
+    """Raised while the circuit breaker refuses calls to a failing upstream"""
+
+
+class UpstreamError(Exception):
+    """Raised for a retryable upstream answer (rate limiting, 5xx)"""
+
+
+class RequestRejectedError(Exception):
+    """Raised when the upstream refuses the request itself (4xx other than 429): retrying would not help"""
+
+
+class CircuitBreaker:
+    """Opens after failure_threshold consecutive failures, lets one trial call through after reset_timeout"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False  # Whether the trial call of the half-open state is in flight
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def before_call(self):
+        """Refuse the call while open; once half-open, only the first caller goes through until it is recorded"""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            if self._trial or time.monotonic() - self.opened_at < self.reset_timeout:
+                raise CircuitOpenError('Service de traduction temporairement indisponible')
+            self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                # A failed trial call in half-open state re-opens for a full period
+                self.opened_at = time.monotonic()
+            self._trial = False
+
+
+def _pool_limits(max_connections):
+    # httpx renamed PoolLimits to Limits in 0.18; googletrans pins an older release
+    if hasattr(httpx, 'Limits'):
+        return {'limits': httpx.Limits(max_connections=max_connections,
+                                       max_keepalive_connections=max_connections)}
+    return {'pool_limits': httpx.PoolLimits(max_keepalive=max_connections, max_connections=max_connections)}
+
+
+class AsyncTranslationClient:
+    """asyncio client for the Google Translate web endpoint.
+
+    One pooled HTTP session, a concurrency semaphore per upstream host,
+    per-request timeouts, retries with full-jitter exponential backoff and
+    a circuit breaker shared by every call. deadline bounds a whole call:
+    waiting for a slot, every attempt and the sleeps between them.
+    """
+
+    def __init__(self, url=GOOGLE_TRANSLATE_URL, timeout=10.0, max_connections=20, concurrency=8,
+                 retries=3, backoff=0.25, deadline=None, breaker=None):
+        self.url = url
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff = backoff
+        # By default, enough for every attempt to time out after the longest backoffs
+        self.deadline = deadline or timeout * (retries + 1) + backoff * (2 ** retries - 1)
+        self.breaker = breaker or CircuitBreaker()
+        self._client = None
+        self._semaphores = {}
+
+    def _session(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout, **_pool_limits(self.max_connections))
+        return self._client
+
+    def _semaphore(self, url):
+        host = urlsplit(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.concurrency)
+        return self._semaphores[host]
+
+    def call_budget(self, count=1):
+        """Seconds a call translating count texts may take: the semaphore lets concurrency of them run at once"""
+        return self.deadline * math.ceil(max(count, 1) / self.concurrency)
+
+    async def _get_json(self, params, deadline=None):
+        loop = asyncio.get_running_loop()
+        if deadline is None:
+            deadline = loop.time() + self.call_budget()
+        self.breaker.before_call()
+        try:
+            data = await asyncio.wait_for(self._request(params), max(deadline - loop.time(), 0))
+        except RequestRejectedError:
+            self.breaker.record_success()  # The upstream is up: the request was at fault
+            raise
+        except BaseException:
+            # Retries exhausted, unreadable answer, cancellation...: all count, and end a trial call
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        return data
+
+    async def _request(self, params):
+        """GET the endpoint, retrying transport errors, timeouts, 429 and 5xx only"""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** (attempt - 1)))
+            try:
+                async with self._semaphore(self.url):
+                    response = await asyncio.wait_for(self._session().get(self.url, params=params), self.timeout)
+                if response.status_code in RETRY_STATUSES or response.status_code >= 500:
+                    raise UpstreamError(f'HTTP {response.status_code}')
+            except (*TRANSPORT_ERRORS, UpstreamError) as e:
+                logger.warning('Translation request failed (attempt %d/%d): %r', attempt + 1, self.retries + 1, e)
+                if attempt == self.retries:
+                    raise
+                continue
+
+            if response.status_code >= 400:
+                raise RequestRejectedError(f'HTTP {response.status_code}')
+            return response.json()
+
+    async def translate(self, text, source_language='auto', target_language='en', deadline=None):
+        """Return (translated_text, detected_source_language); deadline is a time of the running loop"""
+        data = await self._get_json({
+            'client': 'gtx', 'dt': 't', 'sl': source_language, 'tl': target_language, 'q': text
+        }, deadline)
+        translated = ''.join(part[0] for part in data[0] or [] if part and part[0])
+        detected = data[2] if len(data) > 2 and isinstance(data[2], str) else source_language
+        return translated, detected
+
+    async def translate_many(self, texts, source_language='auto', target_language='en'):
+        """Translate texts concurrently (bounded by the host semaphore), keeping their order"""
+        deadline = asyncio.get_running_loop().time() + self.call_budget(len(texts))
+        results = await asyncio.gather(*(self.translate(text, source_language, target_language, deadline)
+                                         for text in texts))
+        return [translated for translated, _ in results]
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class SyncTranslationClient:
+    """Blocking façade running an AsyncTranslationClient on a private event loop thread"""
+
+    def __init__(self, **options):
+        self.options = options
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._client = None
+
+    def _ensure_loop(self):
+        with self._lock:
+            # A forked worker inherits the object but not the loop thread
+            if self._pid != os.getpid():
+                self._loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self._loop.run_forever, name='translation-client', daemon=True)
+                thread.start()
+                self._client = AsyncTranslationClient(**self.options)
+                self._pid = os.getpid()
+        return self._loop
+
+    @property
+    def breaker(self):
+        self._ensure_loop()
+        return self._client.breaker
+
+    def _run(self, coroutine, count):
+        """Wait for a coroutine on the loop thread; one abandoned on timeout is cancelled, freeing its slot"""
+        future = asyncio.run_coroutine_threadsafe(coroutine, self._ensure_loop())
+        try:
+            # The coroutine enforces its own deadline: the margin covers the hand-over between threads
+            return future.result(self._client.call_budget(count) + 1)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def translate(self, text, source_language='auto', target_language='en'):
+        self._ensure_loop()
+        return self._run(self._client.translate(text, source_language, target_language), 1)
+
+    def translate_many(self, texts, source_language='auto', target_language='en'):
+        self._ensure_loop()
+        return self._run(self._client.translate_many(texts, source_language, target_language), len(texts))
+
+
+class AsyncGoogleBackend(TranslationBackend):
+    """Google Translate through the pooled asyncio client"""
+
+    name = 'google_async'
+
+    def __init__(self, timeout=10.0, **options):
+        super().__init__(timeout, **options)
+        self.client = SyncTranslationClient(timeout=timeout, **options)
+
+    def translate(self, text, source_language, target_language):
+        return self.client.translate(text, source_language, target_language)[0]
+
+    def translate_batch(self, texts, source_language, target_language):
+        return self.client.translate_many(list(texts), source_language, target_language)
@@ -0,0 +1,206 @@
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app, has_app_context
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_SIZE = 2048
+DEFAULT_TTL = 30 * 24 * 3600  # 30 days
+DEFAULT_MAX_ROWS = 100000
+PRUNE_EVERY = 500  # Persistent inserts between two size checks
+
+
+def make_key(text, source_language, target_language, backend='google'):
+    """Build the memory key for a (text, source, target) triple translated by a backend.
+
+    The text is taken as is: texts differing only in layout (line breaks,
+    indentation) translate to different layouts and must not share an entry.
+    """
+    raw = f'{backend}\x00{source_language}\x00{target_language}\x00{text}'
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+class TranslationMemory:
+    """Two-tier translation memory: in-process LRU in front of a database table"""
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._inserts_since_prune = 0
+        self.counters = {'memory_hits': 0, 'db_hits': 0, 'misses': 0, 'stores': 0}
+
+    def _config(self, name, default):
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    def _enabled(self):
+        return self._config('TRANSLATION_MEMORY_ENABLED', True)
+
+    def _count(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+
+    def get(self, text, source_language, target_language, backend='google'):
+        """Return the remembered translation, or None"""
+        if not self._enabled():
+            return None
+
+        key = make_key(text, source_language, target_language, backend)
+        ttl = timedelta(seconds=self._config('TRANSLATION_MEMORY_TTL', DEFAULT_TTL))
+        now = datetime.utcnow()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                translated_text, stored_at = entry
+                if now - stored_at < ttl:
+                    self._entries.move_to_end(key)
+                    self.counters['memory_hits'] += 1
+                    return translated_text
+                del self._entries[key]
+
+        translated_text = self._db_get(key, now - ttl)
+        if translated_text is not None:
+            self._remember(key, translated_text, now)
+            self._count('db_hits')
+            return translated_text
+
+        self._count('misses')
+        return None
+
+    def set(self, text, source_language, target_language, translated_text, backend='google'):
+        """Store a translation in both tiers"""
+        if not self._enabled():
+            return
+
+        key = make_key(text, source_language, target_language, backend)
+        now = datetime.utcnow()
+        self._remember(key, translated_text, now)
+        self._db_set(key, text, source_language, target_language, translated_text, now)
+        self._count('stores')
+
+    def _remember(self, key, translated_text, stored_at):
+        max_size = self._config('TRANSLATION_MEMORY_SIZE', DEFAULT_MEMORY_SIZE)
+        with self._lock:
+            self._entries[key] = (translated_text, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    # The persistent tier uses its own connection so that it never commits
+    # or rolls back the objects pending in the request's session.
+
+    def _db_get(self, key, oldest_allowed):
+        if not has_app_context():
+            return None
+
+        from app import db
+        from models import TranslationMemoryEntry
+
+        table = TranslationMemoryEntry.__table__
+        try:
+            with db.engine.begin() as conn:
+                row = conn.execute(
+                    db.select(table.c.id, table.c.translated_text, table.c.created_at)
+                    .where(table.c.key_hash == key)
+                ).first()
+                if row is None:
+                    return None
+                if row.created_at < oldest_allowed:
+                    conn.execute(table.delete().where(table.c.id == row.id))
+                    return None
+                conn.execute(
+                    table.update().where(table.c.id == row.id).values(
+                        hit_count=table.c.hit_count + 1,
+                        last_used_at=datetime.utcnow()
+                    )
+                )
+                return row.translated_text
+        except SQLAlchemyError:
+            logger.exception('Translation memory lookup failed')
+            return None
+
+    def _db_set(self, key, text, source_language, target_language, translated_text, now):
+        if not has_app_context():
+            return
+
+        from app import db
+        from models import TranslationMemoryEntry
+
+        table = TranslationMemoryEntry.__table__
+        try:
+            with db.engine.begin() as conn:
+                updated = conn.execute(
+                    table.update().where(table.c.key_hash == key).values(
+                        translated_text=translated_text,
+                        created_at=now,
+                        last_used_at=now
+                    )
+                ).rowcount
+                if not updated:
+                    conn.execute(table.insert().values(
+                        key_hash=key,
+                        source_text=text,
+                        source_language=source_language,
+                        target_language=target_language,
+                        translated_text=translated_text,
+                        hit_count=0,
+                        created_at=now,
+                        last_used_at=now
+                    ))
+        except SQLAlchemyError:
+            logger.exception('Translation memory store failed')
+            return
+
+        with self._lock:
+            self._inserts_since_prune += 1
+            should_prune = self._inserts_since_prune >= PRUNE_EVERY
+            if should_prune:
+                self._inserts_since_prune = 0
+        if should_prune:
+            self.prune()
+
+    def prune(self):
+        """Drop expired rows, then the least recently used ones above the size limit"""
+        if not has_app_context():
+            return
+
+        from app import db
+        from models import TranslationMemoryEntry
+
+        table = TranslationMemoryEntry.__table__
+        ttl = timedelta(seconds=self._config('TRANSLATION_MEMORY_TTL', DEFAULT_TTL))
+        max_rows = self._config('TRANSLATION_MEMORY_MAX_ROWS', DEFAULT_MAX_ROWS)
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.delete().where(table.c.created_at < datetime.utcnow() - ttl))
+                total = conn.execute(db.select(db.func.count()).select_from(table)).scalar()
+                if total > max_rows:
+                    stale_ids = db.select(table.c.id).order_by(table.c.last_used_at).limit(total - max_rows)
+                    conn.execute(table.delete().where(table.c.id.in_(stale_ids)))
+        except SQLAlchemyError:
+            logger.exception('Translation memory pruning failed')
+
+    def clear(self):
+        """Empty the in-process tier and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            for counter in self.counters:
+                self.counters[counter] = 0
+
+    def stats(self):
+        """Hit/miss counters plus the in-process tier size"""
+        with self._lock:
+            stats = dict(self.counters)
+            stats['memory_entries'] = len(self._entries)
+        lookups = stats['memory_hits'] + stats['db_hits'] + stats['misses']
+        stats['hit_rate'] = round((stats['memory_hits'] + stats['db_hits']) / lookups * 100, 1) if lookups else 0
+        return stats
+
+
+translation_memory = TranslationMemory()
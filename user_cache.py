@@ -0,0 +1,88 @@
+import time
+import threading
+from collections import OrderedDict
+from flask import current_app, has_app_context
+
+DEFAULT_CACHE_SIZE = 1024
+DEFAULT_TTL = 30  # Seconds; bounds how long another worker process can serve a stale profile
+
+
+class UserCache:
+    """Short-lived per-process cache of user rows, so authenticated requests skip the user lookup.
+
+    Column values are cached rather than instances: a cached user is attached
+    to the request's session without a query (merge with load=False), so
+    relationships and edits behave as for a freshly loaded one. Commits that
+    change a user invalidate its entry in this process (see models).
+    """
+
+    def __init__(self):
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0  # Bumped by invalidations, so a lookup racing one does not cache stale values
+        self.counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def _config(self, name, default):
+        if has_app_context():
+            return current_app.config.get(name, default)
+        return default
+
+    def get(self, user_id):
+        """Return the user attached to the current session, or None"""
+        from app import db
+        from models import User
+        from sqlalchemy.orm import make_transient_to_detached
+
+        ttl = self._config('USER_CACHE_TTL', DEFAULT_TTL)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and ttl > 0 and now - entry[1] < ttl:
+                self._entries.move_to_end(user_id)
+                self.counters['hits'] += 1
+                values = entry[0]
+            else:
+                values = None
+                generation = self._generation
+                self.counters['misses'] += 1
+
+        if values is not None:
+            user = User(**values)
+            make_transient_to_detached(user)
+            return db.session.merge(user, load=False)
+
+        user = db.session.get(User, user_id)
+        if user is not None and ttl > 0:
+            values = {column.key: getattr(user, column.key) for column in db.inspect(User).column_attrs}
+            self._remember(user_id, values, now, generation)
+        return user
+
+    def _remember(self, user_id, values, stored_at, generation):
+        max_size = self._config('USER_CACHE_SIZE', DEFAULT_CACHE_SIZE)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._entries[user_id] = (values, stored_at)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_ids):
+        """Forget users whose row changed"""
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                if self._entries.pop(user_id, None) is not None:
+                    self.counters['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, size=len(self._entries))
+
+
+user_cache = UserCache()
@@ -1,28 +1,128 @@
 import os
-from googletrans import Translator
-from langdetect import detect
-from langdetect.lang_detect_exception import LangDetectException
-
-translator = Translator()
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from language_detection import language_detector
+from flask import current_app, has_app_context
+from translation_memory import translation_memory, make_key
+from translation_backends import get_backend
+from singleflight import translation_flights, process_flight, DEFAULT_WAIT_TIMEOUT
+from metrics import stage
 
 def translate_text(text, target_language, source_language='auto'):
-    """Translate text using Google Translate API"""
+    """Translate text with the configured translation backend"""
     try:
         if source_language == target_language:
             return text
         
-        result = translator.translate(text, src=source_language, dest=target_language)
-        return result.text
+        backend = get_backend()
+        with stage('translation_memory'):
+            cached = translation_memory.get(text, source_language, target_language, backend.name)
+        if cached is not None:
+            return cached
+        
+        # Identical requests already in flight wait for that one upstream call
+        key = make_key(text, source_language, target_language, backend.name)
+        with stage('translate'):
+            return translation_flights.do(
+                key, lambda: _translate_upstream(backend, key, text, source_language, target_language)
+            )
     except Exception as e:
         return f"Erreur de traduction: {str(e)}"
 
-def detect_language(text):
-    """Detect the language of the given text"""
+def _singleflight_lock_dir():
+    # Other processes can only reuse our result through the shared memory table
+    if not has_app_context() or not current_app.config.get('TRANSLATION_MEMORY_ENABLED', True):
+        return None
+    return current_app.config.get('SINGLEFLIGHT_LOCK_DIR')
+
+def _translate_upstream(backend, key, text, source_language, target_language):
+    """Call the backend once per key across the processes of this host"""
+    lock_dir = _singleflight_lock_dir()
+    wait_timeout = current_app.config.get('SINGLEFLIGHT_WAIT_TIMEOUT', DEFAULT_WAIT_TIMEOUT) if lock_dir else 0
+    
+    def call():
+        translated_text = backend.translate(text, source_language, target_language)
+        translation_memory.set(text, source_language, target_language, translated_text, backend.name)
+        return translated_text
+    
+    lookup = partial(translation_memory.get, text, source_language, target_language, backend.name)
+    return process_flight(lock_dir, key, lookup, call, wait_timeout)
+
+def translate_batch(texts, target_language, source_language='auto', batch_size=50):
+    """Translate a list of texts, sending only unknown ones upstream in batches"""
+    if source_language == target_language:
+        return list(texts)
+    
+    backend = get_backend()
+    with stage('translation_memory'):
+        results = [translation_memory.get(text, source_language, target_language, backend.name) for text in texts]
+    pending = {i: make_key(texts[i], source_language, target_language, backend.name)
+               for i, result in enumerate(results) if result is None}
+    
+    # Duplicates in the batch and texts already in flight elsewhere are sent only once
+    first_index = {}
+    for i, key in pending.items():
+        first_index.setdefault(key, i)
+    claims = {key: translation_flights.claim(key) for key in first_index}
+    leading = [key for key, (call, leader) in claims.items() if leader]
+    
+    error = None
     try:
-        detected = detect(text)
-        return detected
-    except LangDetectException:
-        return 'auto'
+        for start in range(0, len(leading), batch_size):
+            keys = leading[start:start + batch_size]
+            with stage('translate'):
+                batch = backend.translate_batch([texts[first_index[key]] for key in keys],
+                                                source_language, target_language)
+            for key, translated_text in zip(keys, batch):
+                translation_memory.set(texts[first_index[key]], source_language, target_language,
+                                       translated_text, backend.name)
+                translation_flights.resolve(key, claims[key][0], translated_text)
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        # Never leave waiters hanging, even if the backend returned too few results
+        for key in leading:
+            call = claims[key][0]
+            if not call.done.is_set():
+                translation_flights.resolve(key, call, error=error or RuntimeError('Traduction manquante'))
+    
+    with stage('translate'):
+        for i, key in pending.items():
+            results[i] = translation_flights.wait(claims[key][0])
+    
+    return results
+
+def translate_text_targets(text, target_languages, source_language):
+    """Translate text into several languages at once; returns {target_language: translated_text}.
+
+    source_language should already be detected: each target is translated
+    in its own thread, so the slowest one sets the overall duration.
+    """
+    if len(target_languages) <= 1:
+        return {target: translate_text(text, target, source_language) for target in target_languages}
+    
+    app = current_app._get_current_object()
+    
+    def work(target_language):
+        with app.app_context():
+            return translate_text(text, target_language, source_language)
+    
+    with stage('translate'), ThreadPoolExecutor(max_workers=len(target_languages)) as executor:
+        return dict(zip(target_languages, executor.map(work, target_languages)))
+
+def detect_languages(texts, source_language='auto'):
+    """Detect the language of many texts, running detection once per distinct text"""
+    detected = {}
+    for text in texts:
+        if text not in detected:
+            detected[text] = detect_language(text, source_language)
+    return [detected[text] for text in texts]
+
+def detect_language(text, source_language='auto'):
+    """Detect the language of the given text, unless the user pinned it"""
+    with stage('detection'):
+        return language_detector.detect(text, source_language, get_backend()).language
 
 def allowed_file(filename, extensions=None):
     """Check if file extension is allowed"""
@@ -32,20 +132,21 @@ def allowed_file(filename, extensions=None):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in extensions
 
+LANGUAGES = {
+    'en': 'Anglais',
+    'fr': 'Français',
+    'es': 'Espagnol',
+    'de': 'Allemand',
+    'it': 'Italien',
+    'pt': 'Portugais',
+    'ru': 'Russe',
+    'ja': 'Japonais',
+    'ko': 'Coréen',
+    'zh': 'Chinois',
+    'ar': 'Arabe',
+    'auto': 'Détection automatique'
+}
+
 def get_language_name(code):
     """Get language name from language code"""
-    languages = {
-        'en': 'Anglais',
-        'fr': 'Français',
-        'es': 'Espagnol',
-        'de': 'Allemand',
-        'it': 'Italien',
-        'pt': 'Portugais',
-        'ru': 'Russe',
-        'ja': 'Japonais',
-        'ko': 'Coréen',
-        'zh': 'Chinois',
-        'ar': 'Arabe',
-        'auto': 'Détection automatique'
-    }
-    return languages.get(code, code.upper())
+    return LANGUAGES.get(code, code.upper())
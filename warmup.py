@@ -0,0 +1,50 @@
+import gc
+import time
+import logging
+from sqlalchemy.exc import SQLAlchemyError
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up(app):
+    """Load now what every worker would otherwise load on its first requests; returns the seconds spent.
+
+    Called in the gunicorn master before forking (gunicorn.conf.py): the
+    workers then share these pages copy-on-write instead of each loading
+    its own copy.
+    """
+    from language_detection import language_detector
+    from translation_backends import preload_backend
+
+    started = time.perf_counter()
+    language_detector.preload()
+    preload_backend(app.config['TRANSLATION_BACKEND'])
+    for name in app.jinja_env.list_templates(filter_func=lambda name: name.endswith('.html')):
+        app.jinja_env.get_template(name)
+    recover_jobs(app)
+    # Keep the collector of each worker from writing to (and so copying) the shared objects
+    gc.freeze()
+    elapsed = time.perf_counter() - started
+    logger.info('Warm-up done in %.2f s', elapsed)
+    return elapsed
+
+
+def recover_jobs(app):
+    """Fail the file jobs lost with the workers of a previous run (see jobs.fail_stale_jobs)"""
+    from app import db
+    from jobs import fail_stale_jobs
+
+    with app.app_context():
+        try:
+            fail_stale_jobs()
+        except SQLAlchemyError:
+            db.session.rollback()
+            logger.warning('Stale file jobs not checked: database unavailable', exc_info=True)
+
+
+def after_fork(app):
+    """Drop what a forked worker must not share with its parent"""
+    from app import db
+
+    with app.app_context():
+        db.engine.dispose(close=False)  # Connections opened by the parent stay with it